@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RS.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after the setup of django
+from reservations.events import reservation_events_app, RESERVATION_EVENTS_PATH  # noqa: E402
+
+# The server-sent event streams, they stay open so they're served here instead of by views
+EVENT_STREAMS = {
+    RESERVATION_EVENTS_PATH: reservation_events_app,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in EVENT_STREAMS:
+        return await EVENT_STREAMS[scope['path']](scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -51,6 +51,7 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'middleapp.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -85,10 +86,64 @@ WSGI_APPLICATION = 'RS.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
+# The default profile is a tuned SQLite file (see middleapp/database.py), which serves one server well.
+# When more workers book and read reports at the same time, switch to PostgreSQL (it needs psycopg2), ex:
+# DB_ENGINE=postgresql DB_NAME=rs DB_USER=rs DB_PASSWORD=... DB_HOST=127.0.0.1
+# Compare the profiles with => python manage.py benchmark_database
+
+if os.environ.get('DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'rs'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # keep the connections open between requests instead of connecting on every one
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # how long (in seconds) a write waits for the database lock before failing with "database is locked"
+                'timeout': int(os.environ.get('DB_TIMEOUT', 20)),
+            },
+        }
+    }
+
+# A read replica of the default database for the reports and the exports (see middleapp/routers.py), ex:
+# DB_REPLICA_HOST=10.0.0.2 for PostgreSQL, or DB_REPLICA_NAME=/path/to/copy.sqlite3 to stand in for one locally.
+# DB_REPLICA_LAG is how long (in seconds) the replica may be behind, a user that just wrote reads from the
+# primary database during it, and the reports built from the replica are only cached for it.
+
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        # the tests read and write one database
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['middleapp.routers.ReplicaRouter']
+REPLICA_LAG = int(os.environ.get('DB_REPLICA_LAG', 10))
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/ref/settings/#caches
+# The local memory cache is private to each worker process. When the server runs more than one, point them to a
+# shared cache so they share the reports and their build locks, ex:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
@@ -4,3 +4,4 @@ from middleapp import models
 
 # Register your models here.
 admin.site.register(models.Organization)
+admin.site.register(models.RenderJob)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MiddleappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'middleapp'
+
+    def ready(self):
+        import middleapp.signals
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from django.conf import settings
+
+from middleapp.cache import get_cache_version
+from middleapp.models import Organization
+
+
+class Branding:
+    """
+    The organization with the urls of its images, which are shown on every page and in the invoices
+    """
+
+    def __init__(self, organization):
+        self.organization = organization
+        self.logo_url = organization.logo_url if organization else ''
+        self.background_url = organization.background_url if organization else ''
+
+
+# How long (in seconds) a worker keeps the branding before loading it again. The workers don't share the versions
+# of a LocMem cache, so a worker misses the organization's changes made by the others until it reloads it
+BRANDING_RELOAD_INTERVAL = getattr(settings, 'BRANDING_RELOAD_INTERVAL', 300)
+
+# the branding is kept in the memory of every worker, together with the version of the 'organization' cache group
+# it was loaded at. Saving the organization bumps the version in the shared cache, so every worker reloads it once.
+_loaded = {'version': None, 'branding': None, 'loaded_at': None}
+_lock = threading.Lock()
+
+
+def is_stale(version):
+    return (_loaded['version'] != version
+            or _loaded['loaded_at'] is None
+            or time.monotonic() - _loaded['loaded_at'] >= BRANDING_RELOAD_INTERVAL)
+
+
+def get_branding():
+    """
+    Get the organization's branding without querying the database, unless the organization changed since it was loaded
+    or it was loaded more than BRANDING_RELOAD_INTERVAL seconds ago.
+    Ex: get_branding().organization, get_branding().logo_url
+
+    :return: A Branding object, its organization is None when there is no organization yet
+    """
+    version = get_cache_version('organization')
+    if is_stale(version):
+        with _lock:
+            if is_stale(version):
+                _loaded['branding'] = Branding(Organization.objects.first())
+                _loaded['version'] = version
+                _loaded['loaded_at'] = time.monotonic()
+    return _loaded['branding']
+
+
+def get_logo_url(request):
+    """
+    Get the absolute url of the organization's logo for the PDF invoices, an empty string when there is no logo.
+    The https urls are changed to http for wkhtmltopdf, like the invoices always did.
+    """
+    branding = get_branding()
+    logo_url = request.build_absolute_uri(branding.logo_url) if branding.logo_url else ''
+    if logo_url.startswith('https://'):
+        logo_url = logo_url.replace('https://', 'http://', 1)
+    return logo_url
@@ -0,0 +1,151 @@
+import time
+import uuid
+
+from django.core.cache import cache, caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+# How long (in seconds) a worker may take to build a cache entry before the others stop waiting for it
+BUILD_LOCK_TIMEOUT = 30
+BUILD_WAIT_INTERVAL = 0.1
+
+
+def is_local_cache():
+    """
+    Whether every process has its own cache (LocMemCache), so the workers and the management commands
+    don't see each other's entries, see CACHES in RS/settings.py
+    """
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def get_version_key(name):
+    return f'version:{name}'
+
+
+def get_cache_version(name, timeout=None):
+    """
+    Get the current version of a group of cached data, to be used in the keys of its cache entries.
+    Bumping the version (see bump_cache_version) invalidates all of them at once.
+
+    :param name: The name of the group, ex: 'reservations'
+    :param timeout: How long (in seconds) the version is kept, forever by default. A version that expired
+                    starts again from a new one, like an evicted version.
+    :return: An integer version
+    """
+    version = cache.get(get_version_key(name))
+    if version is None:
+        # start from the current time, so a version that was evicted never comes back with old entries
+        cache.add(get_version_key(name), time.time_ns(), timeout=timeout)
+        version = cache.get(get_version_key(name))
+    return version
+
+
+async def aget_cache_version(name, timeout=None):
+    """
+    The same as get_cache_version, for the async views
+    """
+    version = await cache.aget(get_version_key(name))
+    if version is None:
+        await cache.aadd(get_version_key(name), time.time_ns(), timeout=timeout)
+        version = await cache.aget(get_version_key(name))
+    return version
+
+
+def bump_cache_version(name, timeout=None):
+    # incrementing keeps the timeout the version was added with
+    try:
+        cache.incr(get_version_key(name))
+    except ValueError:
+        cache.add(get_version_key(name), time.time_ns(), timeout=timeout)
+
+
+def bump_cache_version_on_commit(name, timeout=None):
+    """
+    Bump the version once the current transaction is committed, or right away outside of a transaction.
+    Bumping it before the commit lets another worker rebuild an entry from the old rows under the new version.
+    """
+    transaction.on_commit(lambda: bump_cache_version(name, timeout))
+
+
+def get_month(day):
+    return day.strftime('%Y-%m')
+
+
+def get_months(start_date, end_date):
+    """
+    Get the months between two dates, ex: get_months(date(2023, 11, 5), date(2024, 1, 2))
+    returns ['2023-11', '2023-12', '2024-01']
+    """
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append(f'{year}-{month:02}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def get_range_version(name, start_date, end_date):
+    """
+    Get the version of a group of cached data in a range of days, it changes when the version of
+    any of the months in the range is bumped (see bump_month_versions) or the whole group is bumped.
+    Ex: a report of 2023-08 changes when a reservation of 2023-08 changes, but not one of 2023-09
+
+    :param name: The name of the group, ex: 'reservation_reports'
+    :return: A string version
+    """
+    keys = [get_version_key(f'{name}:{month}') for month in get_months(start_date, end_date)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(version) for version in [get_cache_version(name)] + [versions[key] for key in keys])
+
+
+def bump_month_versions(name, days):
+    for month in {get_month(day) for day in days if day is not None}:
+        bump_cache_version(f'{name}:{month}')
+
+
+def bump_month_versions_on_commit(name, days):
+    # the same as bump_cache_version_on_commit, for the months of the given days
+    months = {get_month(day) for day in days if day is not None}
+    transaction.on_commit(lambda: [bump_cache_version(f'{name}:{month}') for month in months])
+
+
+def get_or_build(key, build, timeout):
+    """
+    Get a cache entry, or build it when it's missing. Only one worker builds a missing entry,
+    the others wait for it instead of all running the same expensive queries at once.
+    The workers only share the lock when they share the cache, see CACHES in RS/settings.py
+
+    :param key: The key of the entry
+    :param build: A function that returns the value of the entry, it can't be None
+    :param timeout: How long (in seconds) the entry is kept
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'lock:{key}'
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, BUILD_LOCK_TIMEOUT):
+        try:
+            value = build()
+            cache.set(key, value, timeout)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        return value
+
+    # another worker is building it
+    deadline = time.monotonic() + BUILD_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_WAIT_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            # the other worker failed, or its entry was evicted already
+            break
+    return build()
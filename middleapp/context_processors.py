@@ -1,8 +1,5 @@
-from middleapp.models import *
+from middleapp.branding import get_branding
 
 
 def background_context_processor(request):
-    org = Organization.objects.all().first()
-    background_url = org.background.url if (org and org.background) else ''
-
-    return {'bg_url': background_url}
+    return {'bg_url': get_branding().background_url}
@@ -0,0 +1,42 @@
+# WAL lets the reports read while a booking is written, instead of waiting for it (and the other way around).
+# The WAL file is synced at the checkpoints instead of on every commit, a crash can't corrupt the database with it,
+# only lose the last commits when the machine itself loses power.
+SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    # in milliseconds, the same wait as the connection's timeout option, for the locks taken by the PRAGMAs
+    ('busy_timeout', 20000),
+    # in KiB when negative, the pages kept in memory by each connection
+    ('cache_size', -20000),
+    ('temp_store', 'MEMORY'),
+    ('mmap_size', 128 * 1024 * 1024),
+]
+
+# The values SQLite starts with, for comparing them with SQLITE_PRAGMAS (see the benchmark_database command)
+SQLITE_DEFAULT_PRAGMAS = [
+    ('journal_mode', 'DELETE'),
+    ('synchronous', 'FULL'),
+    ('busy_timeout', 5000),
+    ('cache_size', -2000),
+    ('temp_store', 'DEFAULT'),
+    ('mmap_size', 0),
+]
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    A connection_created receiver that applies SQLITE_PRAGMAS to the new SQLite connections,
+    it's connected in middleapp/signals.py. See the DATABASES in RS/settings.py
+    """
+    if connection.vendor != 'sqlite':
+        return
+    timeout = connection.settings_dict.get('OPTIONS', {}).get('timeout')
+    pragmas = [(name, int(timeout * 1000) if (name == 'busy_timeout' and timeout is not None) else value)
+               for name, value in SQLITE_PRAGMAS]
+    set_pragmas(connection, pragmas)
+
+
+def set_pragmas(connection, pragmas):
+    with connection.cursor() as cursor:
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+from importlib import import_module
+from io import BytesIO
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIRequest
+
+# How often (in seconds) an idle stream sends a comment, so the proxies don't close it
+HEARTBEAT_INTERVAL = 15
+
+# How many events a slow screen can be behind before it's told to reload instead
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, topic, accepts, loop):
+        self.topic = topic
+        self.accepts = accepts
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        # runs in the subscription's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventBroker:
+    """
+    An in-process publish/subscribe broker: the signals publish the changes once, and every open event stream
+    of the process gets them from memory. The events only reach the streams of the process that published them,
+    so the event streams have to be served by the same process as the writes (ex: a single ASGI worker).
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, accepts=None) -> Subscription:
+        """
+        Start receiving the events of a topic in the current event loop
+
+        :param topic: The name of the topic, ex: 'reservations'
+        :param accepts: A function that takes an event's data and returns True to receive it,
+                        all the events are received by default
+        """
+        subscription = Subscription(topic, accepts, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, topic, name, data):
+        """
+        Send an event to the subscribers of a topic, it can be called from any thread
+
+        :param topic: The name of the topic
+        :param name: The name of the event, ex: 'created'
+        :param data: A JSON serializable dictionary
+        """
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.topic == topic]
+
+        event = (name, data)
+        for subscription in subscriptions:
+            if subscription.accepts is not None and not subscription.accepts(data):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # its event loop was closed
+                self.unsubscribe(subscription)
+
+
+broker = EventBroker()
+
+
+def format_event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+def get_request_user(request):
+    # the same as the session and authentication middlewares, the stream doesn't go through them
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    return get_user(request)
+
+
+class EventStreamApp:
+    """
+    An ASGI app that streams the events of a topic as server-sent events (text/event-stream), see RS/asgi.py.
+    The streams stay open, so they're served by the ASGI app directly and not by a view that holds a thread.
+
+    :param topic: The name of the topic
+    :param permission: The permission a user needs to receive its events
+    :param get_filter: A function that takes the query parameters (a dictionary of lists) and returns
+                       the accepts function of the subscription (see EventBroker.subscribe)
+    """
+
+    def __init__(self, topic, permission, get_filter=None):
+        self.topic = topic
+        self.permission = permission
+        self.get_filter = get_filter
+
+    def can_receive(self, request):
+        user = get_request_user(request)
+        return user.is_authenticated and user.has_perm(self.permission)
+
+    async def __call__(self, scope, receive, send):
+        request = ASGIRequest(scope, BytesIO())
+        if not await sync_to_async(self.can_receive)(request):
+            await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'Forbidden'})
+            return
+
+        params = parse_qs(scope.get('query_string', b'').decode())
+        subscription = broker.subscribe(self.topic, self.get_filter(params) if self.get_filter else None)
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # don't let nginx buffer the events
+                (b'x-accel-buffering', b'no'),
+            ]})
+            await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+            await self.stream(subscription, receive, send)
+        finally:
+            broker.unsubscribe(subscription)
+
+    async def stream(self, subscription, receive, send):
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            while True:
+                next_event = asyncio.ensure_future(subscription.queue.get())
+                done, _ = await asyncio.wait({next_event, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    if disconnected.result()['type'] == 'http.disconnect':
+                        next_event.cancel()
+                        return
+                    disconnected = asyncio.ensure_future(receive())
+                    if next_event not in done:
+                        next_event.cancel()
+                        continue
+
+                if next_event not in done:
+                    next_event.cancel()
+                    body = b': heartbeat\n\n'
+                elif subscription.overflowed:
+                    # the screen is too far behind to catch up event by event
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.overflowed = False
+                    body = format_event('reload', {})
+                else:
+                    body = format_event(*next_event.result())
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnected.cancel()
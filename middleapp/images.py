@@ -0,0 +1,147 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# The folder of the storage where the resized copies of the uploaded images are kept
+IMAGE_VARIANTS_DIR = 'imageVariants'
+
+# Resizing the uploaded images doesn't hold the request that uploaded them
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='images')
+
+
+class ImageVariant:
+    """
+    A resized copy of an image field, kept in another image field of the same model.
+    Ex: image_variants = [ImageVariant('image', 'image_thumbnail', (480, 480))]
+
+    :param source: The name of the uploaded image field
+    :param field: The name of the field that keeps the copy, it shouldn't be editable
+    :param size: The (width, height) the copy fits in, the images are never enlarged
+    :param quality: The JPEG quality of the copy
+    """
+
+    def __init__(self, source, field, size, quality=80):
+        self.source = source
+        self.field = field
+        self.size = size
+        self.quality = quality
+
+    def get_name(self, source_name):
+        """
+        The path of the copy of an uploaded image, ex: 'imageVariants/image_thumbnail/facilities/field.jpg'.
+        The uploaded images have unique paths, so each one has its own copy.
+        """
+        return f'{IMAGE_VARIANTS_DIR}/{self.field}/{os.path.splitext(source_name)[0]}.jpg'
+
+    def is_outdated(self, instance):
+        source = getattr(instance, self.source)
+        current = getattr(instance, self.field)
+        if not source:
+            return bool(current)
+        return current.name != self.get_name(source.name)
+
+    def render(self, file):
+        """
+        Resize an image and encode it as a progressive JPEG
+
+        :param file: The uploaded image file
+        :return: The content of the copy
+        """
+        with Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(self.size, Image.LANCZOS)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                # the transparent parts of the logos are shown on white paper
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+            return output.getvalue()
+
+
+def get_image_url(variant, source):
+    """
+    Get the url of the resized copy of an image, or of the uploaded image until its copy is ready
+
+    :param variant: The field file of the copy
+    :param source: The field file of the uploaded image
+    :return: A url, or '' when there is no image
+    """
+    if variant:
+        return variant.url
+    return source.url if source else ''
+
+
+def update_image_variants(instance):
+    """
+    Make the missing or outdated copies of a model's images, see the image_variants of the model
+    """
+    changed_fields = []
+    for variant in instance.image_variants:
+        if not variant.is_outdated(instance):
+            continue
+        current = getattr(instance, variant.field)
+        if current:
+            current.delete(save=False)
+
+        name = None
+        source = getattr(instance, variant.source)
+        if source:
+            with source.open('rb') as file:
+                content = variant.render(file)
+            # replace the copy of the same upload if there is one, so its path stays the same
+            name = variant.get_name(source.name)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(content))
+        setattr(instance, variant.field, name)
+        changed_fields.append(variant.field)
+
+    if changed_fields:
+        instance.save(update_fields=changed_fields)
+    return changed_fields
+
+
+def run_image_variants_job(model_label, pk):
+    try:
+        instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+        if instance is not None:
+            update_image_variants(instance)
+    except Exception:
+        logger.exception('Resizing the images of %s %s failed', model_label, pk)
+    finally:
+        # the worker thread opens its own connection
+        connection.close()
+
+
+def submit_image_variants_job(instance):
+    # the worker can only see the new image after the request's transaction is committed
+    model_label = instance._meta.label
+    pk = instance.pk
+    transaction.on_commit(lambda: executor.submit(run_image_variants_job, model_label, pk))
+
+
+def update_image_variants_on_save(sender, instance, update_fields=None, **kwargs):
+    """
+    A post_save receiver that queues the resizing of the images that were uploaded or removed,
+    it's connected to the models with image_variants in the signals.py of their apps
+    """
+    variants = instance.image_variants
+    if update_fields is not None:
+        variants = [variant for variant in variants if variant.source in update_fields]
+    if any(variant.is_outdated(instance) for variant in variants):
+        submit_image_variants_job(instance)
@@ -0,0 +1,150 @@
+import random
+import statistics
+import threading
+import time
+from datetime import date, time as day_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.db.backends.signals import connection_created
+
+from middleapp.database import SQLITE_DEFAULT_PRAGMAS, set_pragmas, configure_sqlite_connection
+from reservations.models import Facility, TimeSlot, Reservation
+from reservations.queries.report_queries import get_report_info
+from users.models import RSUser
+
+# The benchmark books in a month of its own, far from the real reservations
+BENCHMARK_MONTH = date(2099, 1, 1)
+BENCHMARK_PHONE = '0599999999'
+
+
+def get_benchmark_data(clients):
+    # every client books its own time slot, so they never book the same one
+    customer = RSUser.objects.create(phone=BENCHMARK_PHONE, full_name='benchmark', gender='M')
+    facility = Facility.objects.create(name='benchmark')
+    time_slots = [TimeSlot.objects.create(facility=facility, start_time=day_time(index % 24, index // 24),
+                                          end_time=day_time(index % 24, 59))
+                  for index in range(clients)]
+    return customer, facility, time_slots
+
+
+def delete_benchmark_data(customer, facility):
+    Reservation.objects.filter(facility=facility).delete()
+    facility.delete()
+    customer.delete()
+
+
+def book_and_cancel(customer, facility, time_slot):
+    day = BENCHMARK_MONTH + timedelta(days=random.randrange(28))
+    reservation = Reservation.objects.create(user=customer, facility=facility, time_slot=time_slot, day=day, price=100)
+    reservation.delete()
+
+
+def read_month():
+    end = BENCHMARK_MONTH + timedelta(days=27)
+    for report in get_report_info(BENCHMARK_MONTH, end).values():
+        if not isinstance(report, dict):
+            list(report)
+    list(Reservation.objects.filter(day__range=[BENCHMARK_MONTH, end])
+         .select_related('user', 'facility', 'time_slot')[:50])
+
+
+class Command(BaseCommand):
+    help = ('Measure the throughput of the configured database under concurrent bookings and report reads, '
+            'ex: run it with the default SQLite profile, with --sqlite-defaults, and with DB_ENGINE=postgresql')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='How many clients use the database at the same time')
+        parser.add_argument('--seconds', type=float, default=10, help='How long the benchmark runs')
+        parser.add_argument('--write-ratio', type=float, default=0.3,
+                            help='The share of the operations that book (and cancel) a reservation, between 0 and 1')
+        parser.add_argument('--sqlite-defaults', action='store_true',
+                            help='Run with the SQLite defaults (rollback journal, full sync) instead of the tuned PRAGMAs')
+
+    def run_clients(self, customer, facility, time_slots, options, sqlite_defaults):
+        """
+        Run one client per time slot until the benchmark ends, or until it's interrupted
+
+        :return: A (journal mode, {'read': latencies, 'write': latencies}, errors) tuple
+        """
+        journal_mode = None
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        deadline = time.monotonic() + options['seconds']
+        stop = threading.Event()
+        results = {'read': [], 'write': []}
+        errors = []
+        lock = threading.Lock()
+
+        def client(time_slot):
+            if sqlite_defaults:
+                set_pragmas(connection, SQLITE_DEFAULT_PRAGMAS)
+            try:
+                while time.monotonic() < deadline and not stop.is_set():
+                    kind = 'write' if random.random() < options['write_ratio'] else 'read'
+                    start = time.perf_counter()
+                    try:
+                        if kind == 'write':
+                            book_and_cancel(customer, facility, time_slot)
+                        else:
+                            read_month()
+                    except OperationalError as error:
+                        with lock:
+                            errors.append(str(error))
+                        continue
+                    with lock:
+                        results[kind].append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client, args=[time_slot]) for time_slot in time_slots]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            # an interrupted benchmark stops its clients before their rows are deleted
+            stop.set()
+            for thread in threads:
+                if thread.ident is not None:
+                    thread.join()
+        return journal_mode, results, errors
+
+    def handle(self, *args, **options):
+        sqlite_defaults = options['sqlite_defaults'] and connection.vendor == 'sqlite'
+        if sqlite_defaults:
+            # the journal mode can only be changed while no other connection is open
+            connection_created.disconnect(configure_sqlite_connection)
+            set_pragmas(connection, SQLITE_DEFAULT_PRAGMAS)
+
+        try:
+            customer, facility, time_slots = get_benchmark_data(options['threads'])
+            try:
+                journal_mode, results, errors = self.run_clients(customer, facility, time_slots, options,
+                                                                 sqlite_defaults)
+            finally:
+                # the benchmark rows are written in the live database, they're deleted even when it's interrupted
+                delete_benchmark_data(customer, facility)
+        finally:
+            if sqlite_defaults:
+                # put the tuned PRAGMAs back, the journal mode is kept in the database file
+                connection_created.connect(configure_sqlite_connection)
+                configure_sqlite_connection(None, connection)
+
+        self.stdout.write(f'{connection.vendor}, {options["threads"]} clients, {options["seconds"]:g}s'
+                          f'{" with the SQLite defaults" if sqlite_defaults else ""}')
+        if connection.vendor == 'sqlite':
+            self.stdout.write(f'journal mode during the benchmark: {journal_mode}')
+        for kind, latencies in results.items():
+            if not latencies:
+                self.stdout.write(f'{kind:>6}: none')
+                continue
+            latencies.sort()
+            self.stdout.write(f'{kind:>6}: {len(latencies) / options["seconds"]:.1f}/s, '
+                              f'median {statistics.median(latencies) * 1000:.1f}ms, '
+                              f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms')
+        style = self.style.ERROR if errors else self.style.SUCCESS
+        self.stdout.write(style(f'{len(errors)} failed operations'
+                                f'{" (" + errors[0] + ")" if errors else ""}'))
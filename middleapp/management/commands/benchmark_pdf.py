@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+import pdfkit
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from middleapp.models import Organization
+from middleapp.renderers import ConcurrentRenderer
+from reservations.models import Reservation, Facility
+from reservations.views.invoice_views import get_invoice_html
+from subscriptions.models import Invoice, Subscription, Division, SportCategory
+from subscriptions.views.invoice_views import get_payment_invoice_html
+from users.models import RSUser
+
+INVOICE_OPTIONS = {'enable-local-file-access': ''}
+
+
+def get_sample_documents():
+    """
+    Render the HTML of the latest reservation invoice and subscription invoice,
+    or of made up ones when there are none yet
+    """
+    organization = Organization.objects.first()
+    customer = RSUser(full_name='عميل', phone='0500000000', gender='M')
+
+    reservation = Reservation.objects.select_related('facility').order_by('-id').first()
+    if reservation is None:
+        reservation = Reservation(id=1, user=customer, facility=Facility(name='الملعب 1'), day=date.today(),
+                                  price=115)
+
+    invoice = (Invoice.objects.select_related('subscription__user', 'subscription__division__category')
+               .order_by('-id').first())
+    if invoice is None:
+        subscription = Subscription(user=customer, division=Division(name='الناشئين', default_month_price=200,
+                                                                   category=SportCategory(name='سباحة')))
+        invoice = Invoice(id=1, subscription=subscription, total_price=Decimal(230), paid=Decimal(115),
+                          time=timezone.now(), action='تسديد دفعة')
+
+    return [get_invoice_html(reservation, organization), get_payment_invoice_html(invoice, organization)]
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of rendering the invoice templates with pdfkit.from_string, which looks up '
+            'wkhtmltopdf on every call, and with ConcurrentRenderer, which looks it up once. '
+            'Both start one wkhtmltopdf process per document')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help='How many documents each backend renders')
+        parser.add_argument('--processes', type=int, default=2,
+                            help='How many documents are rendered at the same time by each backend')
+
+    def handle(self, *args, **options):
+        documents = get_sample_documents()
+        count, processes = options['count'], options['processes']
+        batch = [documents[i % len(documents)] for i in range(count)]
+
+        try:
+            pdfkit.configuration()
+        except OSError as error:
+            raise CommandError(str(error))
+
+        def render_per_call(html):
+            return pdfkit.from_string(html, False, options=INVOICE_OPTIONS)
+
+        with ThreadPoolExecutor(max_workers=processes) as threads:
+            start = time.perf_counter()
+            list(threads.map(render_per_call, batch))
+            per_call_seconds = time.perf_counter() - start
+
+        renderer = ConcurrentRenderer(max_concurrent=processes)
+        try:
+            # look up wkhtmltopdf before timing, like a server that already rendered a document
+            renderer.render(documents[0], INVOICE_OPTIONS)
+            start = time.perf_counter()
+            futures = [renderer.submit(html, INVOICE_OPTIONS) for html in batch]
+            for future in futures:
+                future.result()
+            renderer_seconds = time.perf_counter() - start
+        finally:
+            renderer.shutdown()
+
+        self.stdout.write(f'{count} invoices, {processes} at a time')
+        for name, seconds in [('per call', per_call_seconds), ('cached config', renderer_seconds)]:
+            self.stdout.write(f'{name:>14}: {seconds:.2f}s, {count / seconds:.1f} invoices/s')
+        self.stdout.write(self.style.SUCCESS(f'speedup: {per_call_seconds / renderer_seconds:.2f}x'))
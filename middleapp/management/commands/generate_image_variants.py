@@ -0,0 +1,18 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from middleapp.images import update_image_variants
+
+
+class Command(BaseCommand):
+    help = 'Make the missing resized copies of the uploaded images (ex: the images uploaded before they were resized)'
+
+    def handle(self, *args, **options):
+        count = 0
+        for model in apps.get_models():
+            if not hasattr(model, 'image_variants'):
+                continue
+            for instance in model.objects.iterator():
+                if update_image_variants(instance):
+                    count += 1
+        self.stdout.write(self.style.SUCCESS(f'The images of {count} objects were resized'))
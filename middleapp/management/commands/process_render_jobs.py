@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from middleapp.pdf import resume_render_jobs, delete_old_render_jobs, delete_old_cached_pdfs
+
+
+class Command(BaseCommand):
+    help = ('Render the PDF jobs left pending (ex: after a restart), delete the old finished ones '
+            'and the cached invoices that are not used anymore')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=7, help='How many days the finished jobs are kept')
+        parser.add_argument('--cache-days', type=int, default=90, help='How many days the cached invoices are kept')
+
+    def handle(self, *args, **options):
+        count = resume_render_jobs()
+        delete_old_render_jobs(timedelta(days=options['keep_days']))
+        delete_old_cached_pdfs(timedelta(days=options['cache_days']))
+        self.stdout.write(self.style.SUCCESS(f'{count} PDF jobs were rendered'))
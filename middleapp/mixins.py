@@ -0,0 +1,19 @@
+class RelatedObjectsMixin:
+    """
+    Loads the related objects that a list template renders with the list itself, instead of one query per row.
+    Ex: a list of reservations that shows the user, facility and time slot of every row:
+        class ReservationsListView(RelatedObjectsMixin, ListView):
+            select_related = ('user', 'facility', 'time_slot')
+    """
+    select_related = ()
+    prefetch_related = ()
+
+    def shape_queryset(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+    def get_queryset(self):
+        return self.shape_queryset(super().get_queryset())
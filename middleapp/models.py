@@ -1,7 +1,10 @@
 import os
+import uuid
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
+from .images import ImageVariant, IMAGE_VARIANTS_DIR, get_image_url
 from .validators import validate_tax_number, validate_commercial_register
 
 
@@ -15,8 +18,68 @@ class Organization(models.Model):
     commercial_register = models.CharField(max_length=14, validators=[validate_commercial_register])
     logo = models.ImageField(upload_to='organizationLogo/', blank=True, null=True)
     background = models.ImageField(upload_to='organizationBackground/', blank=True, null=True)
+    # resized copies of the images, made in the background after they're uploaded (see middleapp/images.py)
+    logo_web = models.ImageField(upload_to=IMAGE_VARIANTS_DIR, blank=True, null=True, editable=False)
+    background_web = models.ImageField(upload_to=IMAGE_VARIANTS_DIR, blank=True, null=True, editable=False)
+
+    image_variants = [ImageVariant('logo', 'logo_web', (600, 600), quality=90),
+                      ImageVariant('background', 'background_web', (1920, 1080), quality=75)]
+
+    @property
+    def logo_url(self):
+        return get_image_url(self.logo_web, self.logo)
+
+    @property
+    def background_url(self):
+        return get_image_url(self.background_web, self.background)
 
     def clean(self):
         super().clean()
         if not self.id and Organization.objects.exists():
             raise ValidationError('You cannot add more organizations.')
+
+
+class RenderJob(models.Model):
+    """
+    A PDF that is rendered in the background, the request that asks for it only renders its HTML
+    and the user waits for the file on the job's page. See middleapp/pdf.py
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    status_choices = ((PENDING, 'في الانتظار'),
+                      (RUNNING, 'جاري التجهيز'),
+                      (DONE, 'جاهز'),
+                      (FAILED, 'فشل'))
+
+    # the id is in the download link, so it shouldn't be guessable
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
+
+    html = models.TextField(blank=True)
+    # the big documents are rendered in parts instead: the dotted path of a function that generates
+    # the HTML of the parts from the params, ex: 'reservations.views.report_views.get_reservations_record_chunks'
+    document = models.CharField(max_length=255, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    options = models.JSONField(default=dict, blank=True)
+    filename = models.CharField(max_length=255)
+    as_attachment = models.BooleanField(default=False)
+    # the path of the PDF in the documents cache, for the documents that don't change (see get_pdf_cache_name)
+    cache_name = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField(max_length=10, choices=status_choices, default=PENDING)
+    file = models.FileField(upload_to='renderJobs/', blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='render_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.filename} - {self.get_status_display()}'
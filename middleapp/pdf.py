@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.http import FileResponse
+from django.shortcuts import redirect
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from pypdf import PdfWriter
+
+from middleapp.models import RenderJob
+from middleapp.renderers import ConcurrentRenderer
+
+logger = logging.getLogger(__name__)
+
+# A running job that takes longer than this was lost with its worker (ex: the server restarted)
+RENDER_JOB_TIMEOUT = timedelta(minutes=10)
+
+# The folder of the storage where the PDFs of the documents that don't change (ex: invoices) are kept
+PDF_CACHE_DIR = 'pdfCache'
+
+# The rendering threads only wait on the wkhtmltopdf processes, the web workers return right away
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PDF_RENDER_WORKERS', 2), thread_name_prefix='pdf')
+
+renderer = ConcurrentRenderer(max_concurrent=getattr(settings, 'PDF_RENDER_PROCESSES', 2),
+                              wkhtmltopdf=getattr(settings, 'WKHTMLTOPDF_PATH', ''))
+
+
+def render_pdf(html, options=None) -> bytes:
+    """
+    Render an HTML string to a PDF with wkhtmltopdf, with the configuration resolved once (see ConcurrentRenderer)
+
+    :param html: The HTML of the document
+    :param options: A dictionary of wkhtmltopdf options, ex: {'page-size': 'A4'}
+    :return: The content of the PDF
+    """
+    return renderer.render(html, options)
+
+
+def render_chunked_pdf(chunks, options=None) -> bytes:
+    """
+    Render a big document in parts (ex: one per month), a few of them at the same time,
+    then merge them in one PDF. Every part is written to a temporary file as soon as it's rendered,
+    so the memory used by the rendering stays the same however big the document is.
+
+    :param chunks: An iterable of the HTML of the parts, in order
+    :param options: A dictionary of wkhtmltopdf options
+    :return: The content of the merged PDF
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for index, pdf in enumerate(renderer.render_many(chunks, options)):
+            path = os.path.join(directory, f'{index}.pdf')
+            with open(path, 'wb') as file:
+                file.write(pdf)
+            paths.append(path)
+
+        writer = PdfWriter()
+        for path in paths:
+            writer.append(path)
+        output = BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+
+def run_render_job(job_id):
+    """
+    Render a pending job and store its PDF, it does nothing if another worker took the job already
+    """
+    try:
+        claimed = (RenderJob.objects.filter(pk=job_id, status=RenderJob.PENDING)
+                   .update(status=RenderJob.RUNNING, started_at=timezone.now()))
+        if not claimed:
+            return
+
+        job = RenderJob.objects.get(pk=job_id)
+        try:
+            if job.document:
+                pdf = render_chunked_pdf(import_string(job.document)(**job.params), job.options)
+            else:
+                pdf = render_pdf(job.html, job.options)
+        except Exception as error:
+            logger.exception('Rendering the PDF %s failed', job.id)
+            job.status = RenderJob.FAILED
+            job.error = str(error)
+        else:
+            if job.cache_name:
+                if not default_storage.exists(job.cache_name):
+                    default_storage.save(job.cache_name, ContentFile(pdf))
+                job.file.name = job.cache_name
+            else:
+                job.file.save(f'{job.id}.pdf', ContentFile(pdf), save=False)
+            job.status = RenderJob.DONE
+            job.html = ''
+        job.finished_at = timezone.now()
+        job.save()
+    finally:
+        # the worker threads open their own connections
+        connection.close()
+
+
+def submit_render_job(job):
+    # the worker can only see the job after the request's transaction is committed
+    transaction.on_commit(lambda: executor.submit(run_render_job, job.pk))
+
+
+def render_pdf_in_background(request, html, filename, options=None, as_attachment=False, cache_name=''):
+    """
+    Queue the rendering of a PDF and send the user to the job's page, which downloads it once it's ready.
+    Ex: return render_pdf_in_background(request, html, 'Summary_Report.pdf', options={'page-size': 'A4'})
+
+    :param request: The request that asks for the PDF
+    :param html: The HTML of the document
+    :param filename: The name of the downloaded file
+    :param options: A dictionary of wkhtmltopdf options
+    :param as_attachment: Download the file instead of opening it in the browser
+    :param cache_name: Keep the PDF in the documents cache under this name, see get_pdf_cache_name
+    :return: A redirect response to the job's page
+    """
+    job = RenderJob.objects.create(user=request.user, html=html, options=options or {}, filename=filename,
+                                   as_attachment=as_attachment, cache_name=cache_name)
+    submit_render_job(job)
+    return redirect('middleapp:render-job', pk=job.pk)
+
+
+def render_chunked_pdf_in_background(request, document, params, filename, options=None, as_attachment=False):
+    """
+    Like render_pdf_in_background, for the big documents that are rendered in parts (see render_chunked_pdf).
+    The HTML of the parts is made by the worker, so the request doesn't load the document's data.
+    Ex: render_chunked_pdf_in_background(request, 'reservations.views.report_views.get_reservations_record_chunks',
+                                         {'start_date': '2023-01-01', 'end_date': '2023-12-31'}, 'Record.pdf')
+
+    :param document: The dotted path of a function that takes the params and generates the HTML of the parts
+    :param params: A JSON serializable dictionary of the function's keyword arguments
+    """
+    job = RenderJob.objects.create(user=request.user, document=document, params=params, options=options or {},
+                                   filename=filename, as_attachment=as_attachment)
+    submit_render_job(job)
+    return redirect('middleapp:render-job', pk=job.pk)
+
+
+def resume_render_jobs():
+    """
+    Render the jobs that were left pending or lost while running, ex: when the server restarted
+    """
+    stale = timezone.now() - RENDER_JOB_TIMEOUT
+    RenderJob.objects.filter(status=RenderJob.RUNNING, started_at__lt=stale).update(status=RenderJob.PENDING)
+
+    job_ids = list(RenderJob.objects.filter(status=RenderJob.PENDING).order_by('created_at')
+                   .values_list('id', flat=True))
+    for job_id in job_ids:
+        run_render_job(job_id)
+    return len(job_ids)
+
+
+def delete_old_render_jobs(age):
+    """
+    Delete the finished jobs older than the given timedelta, with their files
+    """
+    old_jobs = RenderJob.objects.filter(status__in=[RenderJob.DONE, RenderJob.FAILED],
+                                        finished_at__lt=timezone.now() - age)
+    for job in old_jobs:
+        # the cached documents are shared by all the jobs that asked for them
+        if job.file and not job.cache_name:
+            job.file.delete(save=False)
+        job.delete()
+
+
+def get_pdf_cache_name(template_name, data):
+    """
+    Get the path of a document in the documents cache, from the hash of everything its PDF is made of:
+    the source of its template and the data shown in it. When any of them changes the document gets a new path,
+    so a cached PDF never has to be invalidated.
+    Ex: get_pdf_cache_name('invoiceTemplates/invoice.html', {'id': 5, 'price': 115, 'organization': {...}})
+
+    :param template_name: The name of the template of the document
+    :param data: A JSON serializable dictionary of the data shown in the document
+    :return: A path in the default storage
+    """
+    source = get_template(template_name).template.source
+    content = json.dumps([template_name, source, data], sort_keys=True, default=str, ensure_ascii=False)
+    return f'{PDF_CACHE_DIR}/{hashlib.sha256(content.encode()).hexdigest()}.pdf'
+
+
+def get_organization_data(organization):
+    """
+    The organization's branding shown in its documents, to be part of their cache names
+    """
+    if organization is None:
+        return None
+    data = {field: getattr(organization, field)
+            for field in ['name', 'phone', 'address', 'city', 'tax_number', 'commercial_register']}
+    data['logo'] = organization.logo.name if organization.logo else ''
+    return data
+
+
+def serve_cached_pdf(request, cache_name, get_html, filename, options=None):
+    """
+    Serve a document from the documents cache, or render it in the background and keep it there when it's missing
+
+    :param request: The request that asks for the document
+    :param cache_name: The path of the document in the cache, see get_pdf_cache_name
+    :param get_html: A function that returns the HTML of the document, it's only called when it's missing
+    :param filename: The name of the downloaded file
+    :param options: A dictionary of wkhtmltopdf options
+    """
+    if default_storage.exists(cache_name):
+        return FileResponse(default_storage.open(cache_name, 'rb'), filename=filename, content_type='application/pdf')
+    return render_pdf_in_background(request, get_html(), filename, options=options, cache_name=cache_name)
+
+
+def delete_old_cached_pdfs(age):
+    """
+    Delete the cached documents that weren't rendered again since the given timedelta,
+    the ones that are still in use are rendered again the next time they're opened
+    """
+    if not default_storage.exists(PDF_CACHE_DIR):
+        return
+    oldest = timezone.now() - age
+    for name in default_storage.listdir(PDF_CACHE_DIR)[1]:
+        path = f'{PDF_CACHE_DIR}/{name}'
+        if default_storage.get_modified_time(path) < oldest:
+            default_storage.delete(path)
@@ -0,0 +1,87 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pdfkit
+
+# Resolving the wkhtmltopdf executable runs a `which` process on every pdfkit call, it's done once per process
+_configurations = {}
+_configuration_lock = threading.Lock()
+
+
+def get_configuration(wkhtmltopdf=''):
+    """
+    Get the pdfkit configuration of a wkhtmltopdf executable, it's resolved on the first call only
+
+    :param wkhtmltopdf: The path of the wkhtmltopdf executable, found in the PATH by default
+    :raises OSError: if the executable can't be found, it's resolved again on the next call
+    """
+    configuration = _configurations.get(wkhtmltopdf)
+    if configuration is None:
+        with _configuration_lock:
+            configuration = _configurations.get(wkhtmltopdf)
+            if configuration is None:
+                configuration = _configurations[wkhtmltopdf] = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf)
+    return configuration
+
+
+def render(html, options=None, wkhtmltopdf='') -> bytes:
+    """
+    Render an HTML string to a PDF, with the wkhtmltopdf configuration resolved once
+    """
+    return pdfkit.from_string(html, False, options=options, configuration=get_configuration(wkhtmltopdf))
+
+
+class ConcurrentRenderer:
+    """
+    Renders documents with the cached wkhtmltopdf configuration (see get_configuration), at most max_concurrent
+    of them at the same time. Every document still starts its own wkhtmltopdf process, the threads only wait on them.
+    Ex:
+        renderer = ConcurrentRenderer(max_concurrent=2)
+        pdf = renderer.render(html, options={'page-size': 'A4'})
+    """
+
+    def __init__(self, max_concurrent=2, wkhtmltopdf=''):
+        """
+        :param max_concurrent: How many wkhtmltopdf processes run at the same time
+        :param wkhtmltopdf: The path of the wkhtmltopdf executable, found in the PATH by default
+        """
+        self.max_concurrent = max_concurrent
+        self.wkhtmltopdf = wkhtmltopdf
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='renderer')
+            return self._executor
+
+    def submit(self, html, options=None):
+        """
+        Queue a document and return a Future of its PDF content
+        """
+        return self.get_executor().submit(render, html, options, self.wkhtmltopdf)
+
+    def render(self, html, options=None, timeout=None) -> bytes:
+        return self.submit(html, options).result(timeout)
+
+    def render_many(self, documents, options=None):
+        """
+        Render many documents, max_concurrent at a time, and yield their PDFs in order.
+        The documents are read from the iterable as the previous ones finish, so only a few of them
+        are in memory at a time.
+        """
+        pending = deque()
+        for html in documents:
+            pending.append(self.submit(html, options))
+            if len(pending) >= self.max_concurrent:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
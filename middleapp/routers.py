@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# The alias of the read replica in DATABASES, see RS/settings.py
+REPLICA = 'replica'
+
+# The apps whose data the reports read. The sessions and the users are always read from the primary database,
+# so a user that just logged in is never logged out by a replica that is behind.
+REPLICA_APPS = {'reservations', 'subscriptions'}
+
+# Set for a while on the browser of a user that wrote, so its next requests read its own writes
+PRIMARY_PIN_COOKIE = 'primary_pin'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        # the user wrote in one of its last requests, the replica may still be behind
+        self.pinned = pinned
+        # the current request wrote
+        self.wrote = False
+
+
+def has_replica():
+    return REPLICA in settings.DATABASES
+
+
+def get_replica_lag():
+    """
+    How long (in seconds) the replica may be behind the primary database
+    """
+    return getattr(settings, 'REPLICA_LAG', 10)
+
+
+def get_replica_database():
+    """
+    Get the database the report reads go to: the replica, unless there is none or the current user just wrote.
+    Ex: Reservation.objects.using(get_replica_database()) for a queryset that is evaluated outside use_replica,
+    like the rows of a streamed export
+
+    :return: A database alias
+    """
+    state = _request_state.get()
+    if not has_replica() or (state is not None and (state.pinned or state.wrote)):
+        return 'default'
+    return REPLICA
+
+
+def get_read_database():
+    return get_replica_database() if _read_from_replica.get() else 'default'
+
+
+@contextmanager
+def use_replica():
+    """
+    Send the reads of the reports' apps to the replica, see ReplicaRouter.
+    Ex: with use_replica(): ... or @use_replica() on a view's get method
+    """
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary database inside use_replica, ex: to check a booking against the latest reservations
+    """
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def limit_cache_timeout(timeout):
+    """
+    Limit how long an entry built from the current reads is cached, the entries built from the replica
+    may miss the latest writes so they are only kept for as long as the replica may be behind
+    """
+    return timeout if get_read_database() == 'default' else min(timeout, get_replica_lag())
+
+
+class ReplicaRouter:
+    """
+    Sends the reads made inside use_replica to the replica, and everything else to the primary database
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS and _read_from_replica.get():
+            return get_replica_database()
+        # the related objects are read from the database their object was read from
+        return None
+
+    def db_for_write(self, model, **hints):
+        # the objects read from the replica are saved to the primary database too
+        state = _request_state.get()
+        if state is not None and model._meta.app_label in REPLICA_APPS:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica has the same rows as the primary database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets the tables from the primary database
+        return db != REPLICA
+
+
+class ReplicaPinningMiddleware:
+    """
+    Reads the user's own writes from the primary database: after a request writes to the reports' apps
+    (ex: a booking), the user's requests don't read from the replica until it caught up
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(pinned=PRIMARY_PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote and has_replica():
+            response.set_cookie(PRIMARY_PIN_COOKIE, '1', max_age=get_replica_lag(), httponly=True, samesite='Lax')
+        return response
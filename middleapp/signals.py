@@ -0,0 +1,20 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from middleapp.cache import bump_cache_version
+from middleapp.database import configure_sqlite_connection
+from middleapp.images import update_image_variants_on_save
+from middleapp.models import Organization
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_branding(sender, instance, **kwargs):
+    # every worker reloads the organization on its next request, see middleapp/branding.py
+    bump_cache_version('organization')
+
+
+post_save.connect(update_image_variants_on_save, sender=Organization)
+
+connection_created.connect(configure_sqlite_connection)
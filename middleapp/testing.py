@@ -0,0 +1,44 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from middleapp.branding import get_branding
+from users.applications import get_applications_count
+
+
+class QueryBudgetMixin:
+    """
+    Checks the number of queries of the list pages, for the TestCases of the apps.
+    Every list page loads the related objects its rows show along with the rows, so it runs the same
+    number of queries whether it lists one row or a whole page of them.
+    Ex:
+        class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+            def test_facilities_list(self):
+                self.assertQueryBudget('/facilities', add_facilities, 8)
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assertQueryBudget(self, url, add_rows, budget):
+        """
+        Check that a page runs at most budget queries, and that listing more rows doesn't add any
+
+        :param url: The url of the page
+        :param add_rows: A function that adds the given number of rows to the page
+        :param budget: The most queries the page can run
+        """
+        # the cached pages are invalidated once the rows are committed, like in a request
+        with self.captureOnCommitCallbacks(execute=True):
+            add_rows(1)
+        # the branding and the applications count are loaded once, not per request
+        get_branding()
+        get_applications_count()
+        queries_count = self.count_queries(url)
+        self.assertLessEqual(queries_count, budget)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            add_rows(5)
+        self.assertEqual(self.count_queries(url), queries_count, f'{url} runs a query per row')
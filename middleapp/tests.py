@@ -1,3 +1,101 @@
-from django.test import TestCase
+import time
+from datetime import date
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory
+
+from middleapp import branding
+from middleapp.models import Organization, RenderJob
+from middleapp.routers import use_replica, use_primary, limit_cache_timeout, ReplicaPinningMiddleware, \
+    PRIMARY_PIN_COOKIE, REPLICA
+from reservations.models import Facility, Reservation
+from users.models import RSUser
+
 
 # Create your tests here.
+@mock.patch('middleapp.routers.has_replica', return_value=True)
+class ReplicaRouterTests(TestCase):
+    """
+    The routing only depends on the alias of the replica being configured, so it's checked without a second database
+    """
+
+    def reservations_database(self):
+        return Reservation.objects.all().db
+
+    def test_reads_go_to_the_primary_database_by_default(self, has_replica):
+        self.assertEqual(self.reservations_database(), 'default')
+
+    def test_report_reads_go_to_the_replica(self, has_replica):
+        with use_replica():
+            self.assertEqual(self.reservations_database(), REPLICA)
+            # the users and the sessions are always read from the primary database
+            self.assertEqual(RSUser.objects.all().db, 'default')
+            with use_primary():
+                self.assertEqual(self.reservations_database(), 'default')
+            self.assertEqual(limit_cache_timeout(3600), 10)
+        self.assertEqual(self.reservations_database(), 'default')
+        self.assertEqual(limit_cache_timeout(3600), 3600)
+
+    def test_reads_stay_on_the_primary_database_without_a_replica(self, has_replica):
+        has_replica.return_value = False
+        with use_replica():
+            self.assertEqual(self.reservations_database(), 'default')
+
+    def test_writes_pin_the_user_to_the_primary_database(self, has_replica):
+        databases = []
+
+        def book(request):
+            facility = Facility.objects.create(name='الملعب 1')
+            Reservation.objects.create(facility=facility, day=date(2023, 8, 21), price=100)
+            with use_replica():
+                databases.append(self.reservations_database())
+            return HttpResponse()
+
+        def report(request):
+            with use_replica():
+                databases.append(self.reservations_database())
+            return HttpResponse()
+
+        factory = RequestFactory()
+        response = ReplicaPinningMiddleware(book)(factory.get('/'))
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        pinned_request = factory.get('/')
+        pinned_request.COOKIES[PRIMARY_PIN_COOKIE] = '1'
+        ReplicaPinningMiddleware(report)(pinned_request)
+        response = ReplicaPinningMiddleware(report)(factory.get('/'))
+
+        # the booking and the request right after it read their own writes, the others read from the replica
+        self.assertEqual(databases, ['default', 'default', REPLICA])
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_pinned_user_gets_the_record_from_the_primary_database(self, has_replica):
+        admin = RSUser.objects.create_superuser(phone='0500000001', password='password', full_name='مدير',
+                                                gender='M')
+        self.client.force_login(admin)
+        url = '/recordsReport?start_date=2023-08-01&end_date=2023-08-31'
+
+        # the record is rendered by a worker thread, so the request chooses its database
+        self.client.get(url)
+        job = RenderJob.objects.get()
+        self.assertEqual(job.params['database'], REPLICA)
+
+        self.client.cookies[PRIMARY_PIN_COOKIE] = '1'
+        self.client.get(url)
+        self.assertEqual(RenderJob.objects.exclude(pk=job.pk).get().params['database'], 'default')
+
+
+class BrandingTests(TestCase):
+    def test_branding_is_reloaded_after_the_interval(self):
+        organization = Organization.objects.create(name='النادي', phone='0500000000', address='الرياض', city='الرياض',
+                                                   tax_number='300000000000003', commercial_register='1010000000')
+        self.assertEqual(branding.get_branding().organization.name, 'النادي')
+
+        # a change whose version bump this worker missed, like a bump in another worker's LocMem cache
+        Organization.objects.filter(pk=organization.pk).update(name='النادي الجديد')
+        self.assertEqual(branding.get_branding().organization.name, 'النادي')
+
+        later = time.monotonic() + branding.BRANDING_RELOAD_INTERVAL
+        with mock.patch('middleapp.branding.time.monotonic', return_value=later):
+            self.assertEqual(branding.get_branding().organization.name, 'النادي الجديد')
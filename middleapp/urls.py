@@ -1,7 +1,11 @@
 from django.urls import path
 
-from middleapp.views import OrganizationUpdateView
+from middleapp.views import OrganizationUpdateView, RenderJobView, RenderJobDownloadView, get_render_job_status
 
 urlpatterns = [
     path('company/<int:pk>', OrganizationUpdateView.as_view(), name='update-company'),
+
+    path('pdf/<uuid:pk>', RenderJobView.as_view(), name='render-job'),
+    path('pdf/<uuid:pk>/status', get_render_job_status, name='render-job-status'),
+    path('pdf/<uuid:pk>/download', RenderJobDownloadView.as_view(), name='render-job-download'),
 ]
@@ -1,9 +1,14 @@
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.urls import reverse_lazy
-from django.views.generic import UpdateView
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse_lazy, reverse
+from django.views import View
+from django.views.generic import UpdateView, DetailView
+from jsonview.decorators import json_view
 
 from middleapp.forms import OrganizationForm
-from middleapp.models import Organization
+from middleapp.models import Organization, RenderJob
 
 
 class OrganizationUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
@@ -21,3 +26,33 @@ class OrganizationUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView
         context = super().get_context_data(**kwargs)
         context.update({'org_active': True})
         return context
+
+
+class RenderJobView(LoginRequiredMixin, DetailView):
+    # the page that waits for a PDF rendered in the background, then downloads it
+    model = RenderJob
+    template_name = 'render_job.html'
+    context_object_name = 'job'
+
+    def get_queryset(self):
+        return RenderJob.objects.filter(user=self.request.user)
+
+
+@login_required
+@json_view
+def get_render_job_status(request, pk):
+    job = get_object_or_404(RenderJob.objects.only('id', 'status', 'error'), pk=pk, user=request.user)
+    return {
+        'status': job.status,
+        'download_url': reverse('middleapp:render-job-download', kwargs={'pk': job.pk}) if job.status == job.DONE
+        else None,
+        'error': job.error,
+    }
+
+
+class RenderJobDownloadView(LoginRequiredMixin, View):
+
+    def get(self, request, pk):
+        job = get_object_or_404(RenderJob, pk=pk, user=request.user, status=RenderJob.DONE)
+        return FileResponse(job.file.open('rb'), as_attachment=job.as_attachment, filename=job.filename,
+                            content_type='application/pdf')
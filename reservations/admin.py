@@ -7,3 +7,5 @@ admin.site.register(models.Facility)
 admin.site.register(models.TimeSlot)
 admin.site.register(models.Reservation)
 
+admin.site.register(models.ReservationSeries)
+admin.site.register(models.ReservationSeriesException)
@@ -5,3 +5,5 @@ class ReservationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reservations'
 
+    def ready(self):
+        import reservations.signals
@@ -0,0 +1,52 @@
+from urllib.parse import urlencode
+
+from django.db import transaction
+
+from middleapp.events import broker, EventStreamApp
+
+# The path of the reservations' event stream, it's served by the ASGI app (see RS/asgi.py)
+RESERVATION_EVENTS_PATH = '/events/reservations'
+
+
+def publish_reservation_changes(keys, action='changed'):
+    """
+    Tell the open front desk screens that the reservations of the given (facility_id, day) pairs changed,
+    once the transaction that changed them is committed (the screens reload them right away)
+
+    :param keys: A set of (facility_id, day) pairs
+    :param action: 'created', 'updated', 'deleted', or 'changed' when the reservations of a customer were updated
+                   together (see update_customer_rollups and move_customer_rollups in reservations/signals.py)
+    """
+    events = [{'facility': facility_id, 'day': day.isoformat()} for facility_id, day in keys if day is not None]
+
+    def publish():
+        for event in events:
+            broker.publish('reservations', action, event)
+
+    transaction.on_commit(publish)
+
+
+def get_reservations_filter(params):
+    """
+    Receive only the events of the given facilities and days, ex: ?facility=1&day=2023-08-21&day=2023-08-22
+    """
+    facilities = {int(facility) for facility in params.get('facility', []) if facility.isdigit()}
+    days = set(params.get('day', []))
+
+    def accepts(event):
+        return ((not facilities or event['facility'] in facilities) and
+                (not days or event['day'] in days))
+
+    return accepts
+
+
+reservation_events_app = EventStreamApp('reservations', 'reservations.add_reservation', get_reservations_filter)
+
+
+def get_reservation_events_url(days=(), facilities=()):
+    """
+    Get the url of the event stream of the given days and facilities, ex: for a page that shows the day 2023-08-21:
+        get_reservation_events_url(days=[date(2023, 8, 21)])
+    """
+    params = [('day', str(day)) for day in days] + [('facility', facility) for facility in facilities]
+    return f'{RESERVATION_EVENTS_PATH}?{urlencode(params)}'
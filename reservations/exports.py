@@ -0,0 +1,66 @@
+import codecs
+import csv
+import heapq
+from datetime import time
+
+# The columns of the exported reservations: (header, field)
+EXPORT_COLUMNS = [
+    ('اليوم', 'day'),
+    ('بداية الوقت', 'time_slot__start_time'),
+    ('نهاية الوقت', 'time_slot__end_time'),
+    ('المرفق', 'facility__name'),
+    ('الفئة', 'facility__category__name'),
+    ('العميل', 'user__full_name'),
+    ('رقم الجوال', 'user__phone'),
+    ('السعر', 'price'),
+]
+
+# How many reservations are read from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    # a file-like object for csv.writer that returns the lines instead of keeping them
+    def write(self, value):
+        return value
+
+
+def get_week_row(reservation):
+    """
+    Get the columns of the week of a series (see ReservationSeries.occurrence), in the order of EXPORT_COLUMNS
+    """
+    time_slot, facility, user = reservation.time_slot, reservation.facility, reservation.user
+    return (reservation.day,
+            time_slot.start_time if time_slot else None,
+            time_slot.end_time if time_slot else None,
+            facility.name if facility else None,
+            facility.category.name if facility and facility.category else None,
+            user.full_name if user else None,
+            user.phone if user else None,
+            reservation.price)
+
+
+def get_row_order(row):
+    # the latest day and start time first, the rows without a time slot last in their day
+    return row[0], row[1] is not None, row[1] or time.min
+
+
+def stream_reservations_csv(queryset, series_weeks=()):
+    """
+    Generate the lines of a CSV file of the given reservations, reading them in chunks so the memory
+    stays the same for a day or a year of reservations.
+    Ex: StreamingHttpResponse(stream_reservations_csv(queryset), content_type='text/csv')
+
+    :param queryset: A queryset of reservations, ordered by the latest day and start time first
+    :param series_weeks: The weeks of the series in the same order, they're merged into the reservations
+                         (see reservations.pagination.iter_series_weeks)
+    """
+    writer = csv.writer(Echo())
+    # the byte order mark tells Excel that the file is UTF-8, or it shows the Arabic text garbled
+    yield codecs.BOM_UTF8.decode()
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS])
+
+    rows = queryset.values_list(*[field for _, field in EXPORT_COLUMNS]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    week_rows = (get_week_row(week) for week in series_weeks)
+    for row in heapq.merge(rows, week_rows, key=get_row_order, reverse=True):
+        yield writer.writerow(row)
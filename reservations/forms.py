@@ -1,7 +1,9 @@
+import pytz
 from django import forms
 from django.forms import inlineformset_factory
+from django.utils import timezone
 
-from .models import Reservation, Facility, TimeSlot, FacilityCategory
+from .models import Reservation, ReservationSeries, Facility, TimeSlot, FacilityCategory
 from .queries import get_free_slots, get_all_facilities, get_weekly_free_slots, get_all_customers
 from django_select2 import forms as s2forms
 
@@ -177,6 +179,40 @@ class WeeklyReservationForm2(forms.ModelForm):
         fields = ['user', 'time_slot', 'price']
 
 
+class ReservationSeriesForm(forms.ModelForm):
+    # the weeks are counted from the first one, fewer weeks cancel the last ones and more weeks add to them
+    weeksNumber = forms.IntegerField(required=True, min_value=1, max_value=52, label='عدد الأسابيع')
+
+    def __init__(self, *args, **kwargs):
+        can_change_price = kwargs.pop('can_change_price', False)
+
+        super().__init__(*args, **kwargs)
+
+        self.fields['user'].label = 'العميل'
+        self.fields['price'].label = 'سعر الأسبوع'
+        self.fields['weeksNumber'].initial = self.instance.weeks_count
+
+        if not can_change_price:
+            # the price of the series is kept
+            self.fields['price'].disabled = True
+
+    def clean_weeksNumber(self):
+        weeks_number = self.cleaned_data.get('weeksNumber')
+
+        # the weeks that were already played can't be cancelled, the reports of their days would change
+        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+        past_weeks = len([day for day in self.instance.get_days() if day < today])
+        if weeks_number < past_weeks:
+            raise forms.ValidationError(f'عدد الأسابيع لا يمكن أن يكون أقل من الأسابيع الماضية ({past_weeks})')
+        return weeks_number
+
+    user = forms.ModelChoiceField(required=True, queryset=get_all_customers(), widget=UserWidget)
+
+    class Meta:
+        model = ReservationSeries
+        fields = ['user', 'price', 'weeksNumber']
+
+
 class ReservationSearchForm(forms.ModelForm):
     #  Search by day: a radio button widget, [searchByExactDay, searchByDayRange, searchBeforeDay, searchAfterDay]
     searchByDay = forms.ChoiceField(required=False,
@@ -220,9 +256,15 @@ class ReservationSearchForm(forms.ModelForm):
                   'searchByPrice', 'price', 'priceFrom', 'priceTo']
 
 
+# The years the reports can be made for
+REPORT_MIN_YEAR = 2000
+REPORT_MAX_YEAR = 2100
+
+
 class ReportForm(forms.Form):
     reportType = forms.ChoiceField(required=True, choices=[('summary', 'تقرير ملخص'),
-                                                           ('record', 'كشف الحجوزات')],
+                                                           ('record', 'كشف الحجوزات'),
+                                                           ('record_csv', 'كشف الحجوزات (ملف CSV)')],
                                    label='نوع التقرير', widget=forms.RadioSelect, initial='summary')
 
     reportPeriod = forms.ChoiceField(required=True, choices=[('monthly', 'شهري'), ('yearly', 'سنوي'),
@@ -234,7 +276,8 @@ class ReportForm(forms.Form):
                                                        (9, 'سبتمبر'), (10, 'أوكتوبر'), (11, 'نوفمبر'),
                                                        (12, 'ديسمبر')], label='الشهر')
 
-    year = forms.IntegerField(required=False, min_value=2000, max_value=2100, initial=2023, label='السنة')
+    year = forms.IntegerField(required=False, min_value=REPORT_MIN_YEAR, max_value=REPORT_MAX_YEAR, initial=2023,
+                              label='السنة')
 
     dayFrom = forms.DateField(required=False, input_formats=['%Y-%m-%d'], widget=DateInputWidget, label='من')
     dayTo = forms.DateField(required=False, input_formats=['%Y-%m-%d'], widget=DateInputWidget, label='إلى')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reservations.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the facilities occupancy index from the existing reservations'
+
+    def handle(self, *args, **options):
+        rebuild_occupancy()
+        self.stdout.write(self.style.SUCCESS('The occupancy index was rebuilt'))
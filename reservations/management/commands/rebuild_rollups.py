@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reservations.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily reservations rollups of the reports from the existing reservations'
+
+    def handle(self, *args, **options):
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS('The reservations rollups were rebuilt'))
@@ -1,10 +1,13 @@
 import os
+from datetime import timedelta
 
 from django.db import models
 from django.conf import settings
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 
+from middleapp.images import ImageVariant, IMAGE_VARIANTS_DIR, get_image_url
+
 
 class FacilityCategory(models.Model):
     name = models.CharField(max_length=50)
@@ -19,9 +22,17 @@ class Facility(models.Model):
     category = models.ForeignKey(FacilityCategory, on_delete=models.SET_NULL, null=True)
     default_price = models.IntegerField(default=0)
     image = models.ImageField(upload_to='facilities/', blank=True, null=True)
+    # a resized copy of the image, made in the background after it's uploaded (see middleapp/images.py)
+    image_thumbnail = models.ImageField(upload_to=IMAGE_VARIANTS_DIR, blank=True, null=True, editable=False)
     color = models.CharField(max_length=7, default='#000000')
     suspended = models.BooleanField(default=False)
 
+    image_variants = [ImageVariant('image', 'image_thumbnail', (480, 480))]
+
+    @property
+    def thumbnail_url(self):
+        return get_image_url(self.image_thumbnail, self.image)
+
     def get_absolute_url(self):
         return reverse('reservations:get-facility', kwargs={'pk': self.pk})
 
@@ -55,6 +66,24 @@ class Reservation(models.Model):
     day = models.DateField()
     price = models.IntegerField()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember where the reservation was loaded from, so moving it can update the old facility and day too
+        instance._loaded_key = (instance.__dict__.get('facility_id'), instance.__dict__.get('day'))
+        return instance
+
+    @property
+    def affected_keys(self):
+        """
+        The (facility id, day) pairs whose occupancy changes when this reservation is saved or deleted
+        """
+        keys = {(self.facility_id, self.day)}
+        loaded_key = getattr(self, '_loaded_key', None)
+        if loaded_key is not None:
+            keys.add(loaded_key)
+        return keys
+
     def __str__(self):
         if self.facility and self.user:
             return f'حجز {self.user} لـ {self.facility} يوم {self.day}'
@@ -73,3 +102,144 @@ class Reservation(models.Model):
             ("change_price", "بإمكانه تغيير السعر"),
             ("create_report", "بإمكانه إنشاء تقرير")
         ]
+        constraints = [
+            # a time slot can only be reserved once per day, even when two desks book it at the same moment.
+            # Its index also serves the lookups of a facility's reservations in some days.
+            models.UniqueConstraint(fields=['facility', 'day', 'time_slot'], name='unique_reservation_slot_per_day'),
+        ]
+        indexes = [
+            # the searches, reports and the home page filter and order by day first
+            models.Index(fields=['day', 'facility'], name='reservation_day_facility_idx'),
+            # the reservations of a customer, usually in some days
+            models.Index(fields=['user', 'day'], name='reservation_user_day_idx'),
+        ]
+
+
+class ReservationSeries(models.Model):
+    """
+    A reservation that repeats every week on the same day and time slot, stored once instead of one Reservation
+    per week. Its weeks are expanded when they're read (see reservations/series.py), and a single week can be
+    cancelled with a ReservationSeriesException.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
+    facility = models.ForeignKey(Facility, on_delete=models.SET_NULL, null=True)
+    time_slot = models.ForeignKey(TimeSlot, on_delete=models.SET_NULL, null=True)
+
+    # the day of the first week and of the last one, always the same weekday
+    start_day = models.DateField()
+    end_day = models.DateField()
+    # the price of every week
+    price = models.IntegerField()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the weeks the series was loaded with, so shortening it can update the removed weeks too
+        instance._loaded_keys = {(instance.__dict__.get('facility_id'), day) for day in instance.get_days()}
+        return instance
+
+    @property
+    def weeks_count(self):
+        return (self.end_day - self.start_day).days // 7 + 1
+
+    def get_days(self):
+        """
+        Get the days of all the weeks of the series, including the cancelled ones
+        """
+        return [self.start_day + timedelta(weeks=week) for week in range(self.weeks_count)]
+
+    def occurs_on(self, day):
+        return self.start_day <= day <= self.end_day and (day - self.start_day).days % 7 == 0
+
+    def occurrence(self, day):
+        """
+        Get the week of the series in a given day as an unsaved Reservation, to be shown with the reservations
+        """
+        reservation = Reservation(user_id=self.user_id, facility_id=self.facility_id, time_slot_id=self.time_slot_id,
+                                  day=day, price=self.price)
+        # share the related objects that were already loaded, so the weeks don't load them again one by one
+        for name in ['user', 'facility', 'time_slot']:
+            if self._meta.get_field(name).is_cached(self):
+                setattr(reservation, name, getattr(self, name))
+        reservation.series = self
+        return reservation
+
+    @property
+    def affected_keys(self):
+        """
+        The (facility id, day) pairs whose occupancy changes when this series is saved or deleted
+        """
+        keys = {(self.facility_id, day) for day in self.get_days()}
+        return keys | getattr(self, '_loaded_keys', set())
+
+    def get_absolute_url(self):
+        return reverse('reservations:get-series', kwargs={'pk': self.pk})
+
+    def __str__(self):
+        return f'حجز أسبوعي لـ {self.user} في {self.facility} من {self.start_day} إلى {self.end_day}'
+
+    class Meta:
+        indexes = [
+            # the series that have weeks in a range of days, the ones that ended are skipped first
+            models.Index(fields=['end_day', 'start_day'], name='series_end_start_idx'),
+            models.Index(fields=['user', 'end_day'], name='series_user_end_idx'),
+        ]
+
+
+class ReservationSeriesException(models.Model):
+    """
+    A week of a ReservationSeries that was cancelled on its own, its slot is free in that day
+    """
+    series = models.ForeignKey(ReservationSeries, on_delete=models.CASCADE, related_name='exceptions')
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'day'], name='unique_exception_per_series_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.series_id} - {self.day}'
+
+
+class FacilityDayOccupancy(models.Model):
+    """
+    The reserved time slots of a facility in a day, as a bitmask where bit n is set when the facility's n-th
+    time slot (ordered by id) is reserved. Days without any reservation have no row.
+    It's kept up to date by the signals in reservations/signals.py, see reservations/occupancy.py
+    """
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, related_name='occupancy')
+    day = models.DateField()
+    mask = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facility', 'day'], name='unique_occupancy_per_facility_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.facility_id} - {self.day} - {self.mask:b}'
+
+
+class DailyReservationRollup(models.Model):
+    """
+    The number of reservations and the income of a facility in a day, for the customers of one gender.
+    The reports read these rows instead of the reservations, the category of a row is the category of its facility.
+    It's kept up to date by the signals in reservations/signals.py, see reservations/rollups.py
+    """
+    day = models.DateField()
+    # the reservations of deleted facilities and customers are summed in the rows without a facility or a gender
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, null=True, related_name='rollups')
+    gender = models.CharField(max_length=1, null=True)
+
+    count = models.PositiveIntegerField(default=0)
+    income = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # its index serves both the reports (a range of days) and the refreshes (a facility in some days)
+            models.UniqueConstraint(fields=['day', 'facility', 'gender'], name='unique_rollup_per_day_facility_gender'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} - {self.facility_id} - {self.gender}: {self.count}'
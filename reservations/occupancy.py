@@ -0,0 +1,153 @@
+from collections import defaultdict
+from itertools import chain
+
+from django.db import transaction
+
+from reservations.models import FacilityDayOccupancy, Reservation, ReservationSeries, TimeSlot, Facility
+from reservations.series import get_series_in_days, expand_series
+
+# The masks are stored in a signed 64 bits column
+MAX_INDEXED_SLOTS = 63
+
+
+def get_slot_bits(slot_ids) -> dict:
+    """
+    Get the bit of every time slot of a facility, the slots are numbered by their ids
+    so adding a new slot never moves the bits of the existing ones.
+    Ex: get_slot_bits([7, 3, 9]) returns {3: 1, 7: 2, 9: 4}
+
+    :param slot_ids: The ids of all the TimeSlots of one facility
+    :return: A dictionary of {time_slot_id: bit}
+    """
+    return {slot_id: 1 << index for index, slot_id in enumerate(sorted(slot_ids))}
+
+
+def get_facility_slot_bits(facility_ids) -> dict:
+    """
+    Get the slot bits of many facilities in one query
+
+    :return: A dictionary of {facility_id: {time_slot_id: bit}}
+    """
+    slot_ids = defaultdict(list)
+    for facility_id, slot_id in TimeSlot.objects.filter(facility_id__in=facility_ids).values_list('facility_id', 'id'):
+        slot_ids[facility_id].append(slot_id)
+    return {facility_id: get_slot_bits(ids) for facility_id, ids in slot_ids.items()}
+
+
+def is_indexable(slot_bits) -> bool:
+    return len(slot_bits) <= MAX_INDEXED_SLOTS
+
+
+def get_occupancy_masks(facility_ids, days) -> dict:
+    """
+    Get the occupancy masks of the given facilities in the given days in one query
+
+    :return: A dictionary of {(facility_id, day): mask}, the missing pairs have no reservations
+    """
+    rows = (FacilityDayOccupancy.objects
+            .filter(facility_id__in=facility_ids, day__in=days)
+            .values_list('facility_id', 'day', 'mask'))
+    return {(facility_id, day): mask for facility_id, day, mask in rows}
+
+
+def get_occupied_slot_ids(slot_bits, mask) -> set:
+    return {slot_id for slot_id, bit in slot_bits.items() if mask & bit}
+
+
+def lock_facility(facility_id):
+    """
+    Lock the row of a facility until the end of the transaction, so the refreshes of its derived rows
+    (the occupancy masks and the rollups) run one after the other: a refresh that read the reservations
+    before another one committed would replace its rows with older ones.
+    SQLite has no row locks, its writes are already serialized.
+    """
+    if facility_id is not None:
+        list(Facility.objects.select_for_update().filter(pk=facility_id).values_list('pk', flat=True))
+
+
+def group_days_by_facility(keys) -> list:
+    """
+    Group (facility_id, day) pairs by facility, ordered by the facility id so the facilities are always locked
+    in the same order (see lock_facility), the pairs without a facility come first.
+    Ex: group_days_by_facility({(2, d1), (1, d1), (2, d2)}) returns [(1, {d1}), (2, {d1, d2})]
+    """
+    days_by_facility = defaultdict(set)
+    for facility_id, day in keys:
+        days_by_facility[facility_id].add(day)
+    return sorted(days_by_facility.items(), key=lambda item: (item[0] is not None, item[0] or 0))
+
+
+def refresh_occupancy(facility_id, days):
+    """
+    Recompute the occupancy masks of a facility in the given days from its reservations and the weeks of its series.
+    This is called whenever a reservation or a series is created, moved or deleted.
+
+    :param facility_id: The id of a Facility
+    :param days: A list of date objects
+    """
+    if facility_id is None:
+        return
+
+    days = set(days)
+    with transaction.atomic():
+        # the rows are read and replaced under the facility's lock
+        lock_facility(facility_id)
+        slot_bits = get_slot_bits(TimeSlot.objects.filter(facility_id=facility_id).values_list('id', flat=True))
+
+        masks = defaultdict(int)
+        # facilities with too many slots to fit in a mask are not indexed, the readers fall back to the reservations
+        if is_indexable(slot_bits):
+            reserved = (Reservation.objects
+                        .filter(time_slot__facility_id=facility_id, day__in=days)
+                        .values_list('day', 'time_slot_id'))
+            for day, time_slot_id in reserved:
+                masks[day] |= slot_bits.get(time_slot_id, 0)
+
+            series = ReservationSeries.objects.filter(time_slot__facility_id=facility_id)
+            for reservation in expand_series(get_series_in_days(days, series), days):
+                masks[reservation.day] |= slot_bits.get(reservation.time_slot_id, 0)
+
+        FacilityDayOccupancy.objects.filter(facility_id=facility_id, day__in=days).delete()
+        FacilityDayOccupancy.objects.bulk_create([FacilityDayOccupancy(facility_id=facility_id, day=day, mask=mask)
+                                                  for day, mask in masks.items() if mask])
+
+
+def refresh_occupancy_for_keys(keys):
+    """
+    Refresh the occupancy of a group of (facility_id, day) pairs, with one refresh per facility
+    """
+    for facility_id, days in group_days_by_facility(keys):
+        refresh_occupancy(facility_id, days)
+
+
+def rebuild_occupancy(facility_ids=None):
+    """
+    Rebuild the whole occupancy index of the given facilities (or all of them) from the reservations
+    and the weeks of the series. It's needed when a time slot is deleted, because the bits of the following slots move.
+    """
+    slots = TimeSlot.objects.all()
+    reservations = Reservation.objects.filter(time_slot__isnull=False)
+    series = ReservationSeries.objects.filter(time_slot__isnull=False).select_related('time_slot')
+    stale = FacilityDayOccupancy.objects.all()
+    if facility_ids is not None:
+        slots = slots.filter(facility_id__in=facility_ids)
+        reservations = reservations.filter(time_slot__facility_id__in=facility_ids)
+        series = series.filter(time_slot__facility_id__in=facility_ids)
+        stale = stale.filter(facility_id__in=facility_ids)
+
+    facility_slot_bits = get_facility_slot_bits(set(slots.values_list('facility_id', flat=True)))
+
+    masks = defaultdict(int)
+    reserved = reservations.values_list('time_slot__facility_id', 'day', 'time_slot_id')
+    weeks = ((reservation.time_slot.facility_id, reservation.day, reservation.time_slot_id)
+             for reservation in expand_series(series.prefetch_related('exceptions')))
+    for facility_id, day, time_slot_id in chain(reserved.iterator(), weeks):
+        slot_bits = facility_slot_bits.get(facility_id, {})
+        if is_indexable(slot_bits):
+            masks[(facility_id, day)] |= slot_bits.get(time_slot_id, 0)
+
+    with transaction.atomic():
+        stale.delete()
+        FacilityDayOccupancy.objects.bulk_create([FacilityDayOccupancy(facility_id=facility_id, day=day, mask=mask)
+                                                  for (facility_id, day), mask in masks.items() if mask],
+                                                 batch_size=1000)
@@ -0,0 +1,195 @@
+import hashlib
+import heapq
+from datetime import datetime, time
+from itertools import dropwhile, islice
+
+from django.core.cache import cache
+from django.db.models import F, Q
+
+from middleapp.cache import get_cache_version
+
+# How long (in seconds) the total count of a search is kept
+COUNT_CACHE_TIMEOUT = 5 * 60
+
+
+class KeysetPage:
+    """
+    A page of reservations found by seeking from the (day, start time, id) of a row next to it,
+    instead of counting and skipping all the rows before it like an OFFSET page does
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def get_cursor(reservation):
+    """
+    Encode the position of a reservation in the list as a string, ex: '2023-08-21_16:00:00_52',
+    the weeks of a series have the id of their series instead, ex: '2023-08-21_16:00:00_s7'
+    """
+    start_time = reservation.time_slot.start_time.strftime('%H:%M:%S') if reservation.time_slot else ''
+    series = getattr(reservation, 'series', None)
+    position = f's{series.pk}' if series is not None else reservation.id
+    return f'{reservation.day.strftime("%Y-%m-%d")}_{start_time}_{position}'
+
+
+def parse_cursor(cursor):
+    """
+    Decode a cursor made by get_cursor
+
+    :return: A (day, start_time, reservation_id, series_id) tuple, start_time is None for the reservations without
+             a time slot, reservation_id is 0 for the weeks of a series and series_id is 0 for the reservations.
+             None if the cursor is not valid
+    """
+    try:
+        day, start_time, position = cursor.split('_')
+        day = datetime.strptime(day, '%Y-%m-%d').date()
+        start_time = datetime.strptime(start_time, '%H:%M:%S').time() if start_time else None
+        if position.startswith('s'):
+            return day, start_time, 0, int(position[1:])
+        return day, start_time, int(position), 0
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def get_position(day, start_time, reservation_id, series_id):
+    # the list is in the reverse order of the positions, the weeks of the series come after the reservations
+    # that start at the same time
+    return day, start_time is not None, start_time or time.min, reservation_id, series_id
+
+
+def get_list_position(reservation):
+    """
+    Get the position of a reservation (or of the week of a series) in the list, see get_position
+    """
+    start_time = reservation.time_slot.start_time if reservation.time_slot else None
+    series = getattr(reservation, 'series', None)
+    if series is not None:
+        return get_position(reservation.day, start_time, 0, series.pk)
+    return get_position(reservation.day, start_time, reservation.id, 0)
+
+
+def get_series_weeks(series, include_day=None, reverse=False):
+    # the weeks of one series in the list order, the days are read now and not when the weeks are generated
+    cancelled = {exception.day for exception in series.exceptions.all()}
+    days = [day for day in series.get_days() if day not in cancelled and (include_day is None or include_day(day))]
+    return (series.occurrence(day) for day in (days if reverse else days[::-1]))
+
+
+def iter_series_weeks(series, include_day=None, reverse=False):
+    """
+    Generate the weeks of some series in the list order (latest first), or in the reverse order.
+    The weeks are expanded lazily, so a page only expands the weeks it shows and the ones before it.
+
+    :param series: An iterable of ReservationSeries with their time slots and exceptions loaded,
+                   see get_series_queryset_from_params
+    :param include_day: A function that tells if a day is listed, all the days are by default
+    :param reverse: Generate the weeks from the earliest one
+    """
+    return heapq.merge(*[get_series_weeks(one_series, include_day, reverse) for one_series in series],
+                       key=get_list_position, reverse=not reverse)
+
+
+def get_rows_after(day, start_time, reservation_id):
+    """
+    The rows that come after a position in the list order: -day, -start_time (the missing ones last), -id
+    """
+    if start_time is None:
+        return Q(day__lt=day) | Q(day=day, time_slot__start_time__isnull=True, id__lt=reservation_id)
+
+    return (Q(day__lt=day) |
+            Q(day=day, time_slot__start_time__lt=start_time) |
+            Q(day=day, time_slot__start_time__isnull=True) |
+            Q(day=day, time_slot__start_time=start_time, id__lt=reservation_id))
+
+
+def get_rows_before(day, start_time, reservation_id):
+    if start_time is None:
+        return (Q(day__gt=day) |
+                Q(day=day, time_slot__start_time__isnull=False) |
+                Q(day=day, time_slot__start_time__isnull=True, id__gt=reservation_id))
+
+    return (Q(day__gt=day) |
+            Q(day=day, time_slot__start_time__gt=start_time) |
+            Q(day=day, time_slot__start_time=start_time, id__gt=reservation_id))
+
+
+def get_keyset_page(queryset, after=None, before=None, per_page=10, series=None, include_day=None):
+    """
+    Get a page of reservations in the order of the reservations list (latest day and time first).
+    Ex: the first page is get_keyset_page(queryset), the following one is
+        get_keyset_page(queryset, after=page.next_cursor), and the one before it is
+        get_keyset_page(queryset, before=page.previous_cursor)
+
+    :param queryset: A queryset of reservations, its ordering is replaced
+    :param after: The cursor of the last row of the previous page
+    :param before: The cursor of the first row of the next page
+    :param per_page: The number of reservations in a page
+    :param series: The series whose weeks are listed with the reservations, see iter_series_weeks
+    :param include_day: A function that tells if a week of the series is listed, see iter_series_weeks
+    :return: A KeysetPage object
+    """
+    order = [F('day').desc(), F('time_slot__start_time').desc(nulls_last=True), F('id').desc()]
+    reverse_order = [F('day').asc(), F('time_slot__start_time').asc(nulls_first=True), F('id').asc()]
+    queryset = queryset.select_related('time_slot')
+
+    after = parse_cursor(after)
+    before = parse_cursor(before)
+    weeks = iter_series_weeks(series or [], include_day, reverse=before is not None)
+
+    if before is not None:
+        # read the page backwards from the cursor, then put it back in order
+        rows = list(queryset.filter(get_rows_before(*before[:3])).order_by(*reverse_order)[:per_page + 1])
+        weeks = dropwhile(lambda week: get_list_position(week) <= get_position(*before), weeks)
+        rows = list(islice(heapq.merge(rows, weeks, key=get_list_position), per_page + 1))
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            queryset = queryset.filter(get_rows_after(*after[:3]))
+            weeks = dropwhile(lambda week: get_list_position(week) >= get_position(*after), weeks)
+        rows = list(queryset.order_by(*order)[:per_page + 1])
+        rows = list(islice(heapq.merge(rows, weeks, key=get_list_position, reverse=True), per_page + 1))
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(rows,
+                      next_cursor=get_cursor(rows[-1]) if (rows and has_next) else None,
+                      previous_cursor=get_cursor(rows[0]) if (rows and has_previous) else None)
+
+
+def get_cached_count(queryset, params, series=None, include_day=None):
+    """
+    Count the results of a search once per search parameters, until a reservation changes
+
+    :param queryset: The queryset of the search results
+    :param params: The validated search parameters (see validate_reservation_search_params)
+    :param series: The series whose weeks are in the results, see get_keyset_page
+    :param include_day: A function that tells if a week of the series is in the results
+    """
+    signature = hashlib.sha256(repr(sorted(params.items())).encode()).hexdigest()
+    key = f'reservations_count:{get_cache_version("reservations")}:{signature}'
+
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        for one_series in series or []:
+            count += sum(1 for _ in get_series_weeks(one_series, include_day))
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
@@ -1,2 +1,5 @@
 from .timeSlotQueries import *
-from .report_queries import get_report_info
+from .report_queries import get_report_info, get_cached_report_info
+from .availability_queries import get_availability_grid
+from .board_queries import get_today_board
+from .heatmap_queries import get_occupancy_heatmap, get_cached_occupancy_heatmap
@@ -0,0 +1,116 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+from reservations import models
+from reservations.occupancy import get_slot_bits, get_occupancy_masks, is_indexable
+from reservations.series import get_series_in_days, expand_series
+
+
+class AvailabilityGrid:
+    """
+    The free/occupied matrix of the time slots of a group of facilities over a range of days.
+    It is built with a fixed number of queries (see get_availability_grid), no matter how many
+    facilities or days it covers, and then answers every availability question from memory.
+    """
+
+    def __init__(self, facilities, slots, masks, days):
+        """
+        :param facilities: A list of Facility objects
+        :param slots: A dictionary of {facility_id: [TimeSlot, ...]} ordered by start time
+        :param masks: A dictionary of {(facility_id, day): occupancy mask}, see reservations/occupancy.py
+        :param days: A list of date objects covered by the grid
+        """
+        self.facilities = facilities
+        self.days = days
+        self._slots = slots
+        self._masks = masks
+        self._bits = {}
+        for facility_slots in slots.values():
+            self._bits.update(get_slot_bits([slot.id for slot in facility_slots]))
+
+    def slots(self, facility_id):
+        """
+        Get all the slots (reserved and free) of a facility ordered by start time
+        """
+        return self._slots.get(facility_id, [])
+
+    def occupied_mask(self, facility_id, days=None):
+        """
+        Get the slots of a facility that are reserved in any of the given days, as a bitmask
+        """
+        days = self.days if days is None else [to_date(day) for day in days]
+        mask = 0
+        for day in days:
+            mask |= self._masks.get((facility_id, day), 0)
+        return mask
+
+    def is_free(self, time_slot, day):
+        return not (self.occupied_mask(time_slot.facility_id, [day]) & self._bits[time_slot.id])
+
+    def free_slots(self, facility_id, days=None):
+        """
+        Get the slots of a facility that are free in all the given days
+
+        :param facility_id: The id of a Facility
+        :param days: A list of dates, defaults to all the days of the grid
+        :return: A list of TimeSlot objects ordered by start time
+        """
+        mask = self.occupied_mask(facility_id, days)
+        return [slot for slot in self.slots(facility_id) if not mask & self._bits[slot.id]]
+
+    def free_slot_ids(self, facility_id, days=None):
+        return [slot.id for slot in self.free_slots(facility_id, days)]
+
+    def facilities_and_slots(self, day):
+        """
+        Get the free slots of every facility in a given day, in the shape used by the free slots page
+        """
+        return [{'facility_name': facility.name, 'free_slots': self.free_slots(facility.id, [day])}
+                for facility in self.facilities]
+
+
+def to_date(day) -> date:
+    if isinstance(day, str):
+        return datetime.strptime(day, '%Y-%m-%d').date()
+    return day
+
+
+def get_availability_grid(days, facilities=None) -> AvailabilityGrid:
+    """
+    Compute the availability of the facilities' time slots in the given days using three queries:
+    one for the facilities, one for their time slots and one for their occupancy masks in those days.
+    Ex: to get the free slots of all the facilities on 2023-08-21, call:
+        get_availability_grid(['2023-08-21']).facilities_and_slots('2023-08-21')
+
+    :param days: A list of dates (date objects or YYYY-MM-dd strings)
+    :param facilities: A list of Facility objects, defaults to all the facilities
+    :return: An AvailabilityGrid object
+    """
+    days = [to_date(day) for day in days]
+
+    if facilities is None:
+        facilities = list(models.Facility.objects.all())
+    facility_ids = [facility.id for facility in facilities]
+
+    slots = defaultdict(list)
+    for slot in models.TimeSlot.objects.filter(facility_id__in=facility_ids).order_by('start_time'):
+        slots[slot.facility_id].append(slot)
+
+    masks = get_occupancy_masks(facility_ids, days)
+
+    # facilities with too many slots to be indexed are read from their reservations
+    unindexed = [facility_id for facility_id, facility_slots in slots.items()
+                 if not is_indexable(facility_slots)]
+    if unindexed:
+        reserved = list(models.Reservation.objects
+                        .filter(day__in=days, time_slot__facility_id__in=unindexed)
+                        .values_list('time_slot__facility_id', 'day', 'time_slot_id'))
+        series = models.ReservationSeries.objects.filter(time_slot__facility_id__in=unindexed).select_related('time_slot')
+        reserved += [(reservation.time_slot.facility_id, reservation.day, reservation.time_slot_id)
+                     for reservation in expand_series(get_series_in_days(days, series), days)]
+        for facility_id, day, time_slot_id in reserved:
+            # the grid numbers every slot, so these masks just aren't limited to 63 bits
+            slot_ids = sorted(slot.id for slot in slots[facility_id])
+            masks[(facility_id, day)] = masks.get((facility_id, day), 0) | (1 << slot_ids.index(time_slot_id))
+
+    return AvailabilityGrid(facilities, slots, masks, days)
@@ -0,0 +1,83 @@
+from datetime import datetime, time, timedelta
+
+import pytz
+from django.core.cache import cache
+from django.utils import timezone
+
+from middleapp.cache import get_cache_version
+from reservations.models import Reservation, ReservationSeries
+from reservations.series import get_series_in_days, expand_series
+
+# The reservations that start before this time belong to the night of the previous day
+BUSINESS_DAY_CUTOFF = time(4, 0)
+
+# The board is recomputed at least this often (in seconds), even if no reservation changes
+BOARD_CACHE_TIMEOUT = 30
+
+
+def get_business_day(now):
+    """
+    Get the day that the front desk is working on, the nights continue until BUSINESS_DAY_CUTOFF
+    Ex: on 2023-08-22 at 01:00 the business day is still 2023-08-21
+    """
+    if now.time() < BUSINESS_DAY_CUTOFF:
+        return now.date() - timedelta(days=1)
+    return now.date()
+
+
+def get_reservation_times(reservation, tz):
+    """
+    Get the start and end datetimes of a reservation, the slots that end before they start end in the next day
+    """
+    start = tz.localize(datetime.combine(reservation.day, reservation.time_slot.start_time))
+    end = tz.localize(datetime.combine(reservation.day, reservation.time_slot.end_time))
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def compute_business_day_board(business_day):
+    """
+    Get the reservations (and the weeks of the series) that run during a business day, with their end datetimes,
+    ordered by their start time
+    """
+    tz = pytz.timezone('Asia/Riyadh')
+    window_start = tz.localize(datetime.combine(business_day, BUSINESS_DAY_CUTOFF))
+    window_end = window_start + timedelta(days=1)
+
+    days = [business_day - timedelta(days=1), business_day, business_day + timedelta(days=1)]
+    candidates = list(Reservation.objects
+                      .filter(day__range=[days[0], days[-1]], time_slot__isnull=False)
+                      .select_related('user', 'facility', 'time_slot'))
+    series = ReservationSeries.objects.filter(time_slot__isnull=False).select_related('user', 'facility', 'time_slot')
+    candidates += expand_series(get_series_in_days(days, series), days)
+
+    board = []
+    for reservation in candidates:
+        start, end = get_reservation_times(reservation, tz)
+        if end > window_start and start < window_end:
+            board.append((start, end, reservation))
+
+    board.sort(key=lambda item: item[0])
+    return [(end, reservation) for _, end, reservation in board]
+
+
+def get_today_board(now=None):
+    """
+    Get the upcoming and running reservations of the current business day, including the slots after midnight.
+    The business day's reservations are cached for a few seconds and invalidated whenever a reservation changes,
+    only the ones that already ended are filtered out on every call.
+
+    :param now: An aware datetime, defaults to the current time
+    :return: A list of Reservation objects ordered by their start time
+    """
+    now = (now or timezone.now()).astimezone(pytz.timezone('Asia/Riyadh'))
+    business_day = get_business_day(now)
+    key = f'today_board:{get_cache_version("reservations")}:{business_day}'
+
+    board = cache.get(key)
+    if board is None:
+        board = compute_business_day_board(business_day)
+        cache.set(key, board, BOARD_CACHE_TIMEOUT)
+
+    return [reservation for end, reservation in board if end >= now]
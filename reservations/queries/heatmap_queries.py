@@ -0,0 +1,107 @@
+import calendar
+from datetime import date
+
+from django.db.models import Count
+
+from middleapp.cache import get_or_build, get_range_version, get_cache_version
+from middleapp.routers import limit_cache_timeout
+from reservations.models import Reservation, ReservationSeries, Facility
+from reservations.queries.report_queries import REPORT_CACHE_TIMEOUT
+from reservations.series import get_series_in_days, expand_series
+
+# The ratios at which a cell of the heatmap moves to the next shade, see get_heat_level
+HEAT_LEVELS = (0.25, 0.5, 0.75)
+
+
+def get_month_days(year, month):
+    _, last_day = calendar.monthrange(year, month)
+    return [date(year, month, day) for day in range(1, last_day + 1)]
+
+
+def get_heat_level(occupied, slots):
+    """
+    Get the shade of a heatmap cell: 0 when nothing is occupied, then 1 to 4 by the quarters of the slots
+    """
+    if not occupied or not slots:
+        return 0
+    ratio = occupied / slots
+    return 1 + sum(ratio >= level for level in HEAT_LEVELS)
+
+
+def get_heatmap_row(name, slots, occupied_by_day, days):
+    cells = [{'day': day, 'occupied': occupied_by_day.get(day, 0), 'slots': slots,
+              'level': get_heat_level(occupied_by_day.get(day, 0), slots)}
+             for day in days]
+    occupied = sum(cell['occupied'] for cell in cells)
+    total = slots * len(days)
+    return {'name': name, 'slots': slots, 'cells': cells, 'occupied': occupied, 'total': total,
+            'ratio': round(occupied * 100 / total) if total else 0}
+
+
+def get_occupancy_heatmap(year, month):
+    """
+    Get the occupied slots over the total slots of every day of a month, per facility and per category.
+    The occupied slots of the whole month are counted in one grouped query over the reservations and their slots,
+    instead of one query per facility and day like the free slots page, and the weeks of the series are added to them.
+    this returns a dictionary, like the following:
+    {'days': [date(2023, 8, 1), etc...],
+     'facilities': [{'name': 'Facility 1', 'slots': 12, 'occupied': 40, 'total': 372, 'ratio': 11,
+                     'cells': [{'day': date(2023, 8, 1), 'occupied': 3, 'slots': 12, 'level': 2}, etc...]},
+                    etc...],
+     'categories': [the same rows, with the slots of all the facilities of the category]}
+
+    :param year: An integer year
+    :param month: An integer month (1-12)
+    """
+    days = get_month_days(year, month)
+
+    # the slots are counted with the facility they belong to now, a reservation whose slot was deleted isn't counted
+    occupied_rows = (Reservation.objects
+                     .filter(day__range=[days[0], days[-1]], time_slot__facility__isnull=False)
+                     .values('time_slot__facility_id', 'day')
+                     .annotate(occupied=Count('time_slot', distinct=True))
+                     .order_by())
+    occupied = {}
+    for row in occupied_rows:
+        occupied.setdefault(row['time_slot__facility_id'], {})[row['day']] = row['occupied']
+
+    # the weeks of the series aren't rows, they're expanded from the series that run during the month
+    series = ReservationSeries.objects.filter(time_slot__facility__isnull=False).select_related('time_slot')
+    for reservation in expand_series(get_series_in_days(days, series), days):
+        facility_occupied = occupied.setdefault(reservation.time_slot.facility_id, {})
+        facility_occupied[reservation.day] = facility_occupied.get(reservation.day, 0) + 1
+
+    facilities = (Facility.objects
+                  .filter(suspended=False)
+                  .select_related('category')
+                  .annotate(slots_count=Count('timeslot'))
+                  .order_by('category__name', 'name'))
+
+    facility_rows = []
+    categories = {}
+    for facility in facilities:
+        facility_occupied = occupied.get(facility.id, {})
+        facility_rows.append(get_heatmap_row(facility.name, facility.slots_count, facility_occupied, days))
+
+        category_name = facility.category.name if facility.category else 'بدون تصنيف'
+        category = categories.setdefault(category_name, {'slots': 0, 'occupied': {}})
+        category['slots'] += facility.slots_count
+        for day, count in facility_occupied.items():
+            category['occupied'][day] = category['occupied'].get(day, 0) + count
+
+    category_rows = [get_heatmap_row(name, category['slots'], category['occupied'], days)
+                     for name, category in categories.items()]
+
+    return {'days': days, 'facilities': facility_rows, 'categories': category_rows}
+
+
+def get_cached_occupancy_heatmap(year, month):
+    """
+    Get the heatmap of a month from the cache, it's rebuilt once the reservations of the month change,
+    a time slot changes or a facility or a category changes (see reservations/signals.py)
+    """
+    days = get_month_days(year, month)
+    key = (f'occupancy_heatmap:{get_range_version("reservation_reports", days[0], days[-1])}:'
+           f'{get_cache_version("time_slots")}:{get_cache_version("facilities")}:{year}-{month:02}')
+
+    return get_or_build(key, lambda: get_occupancy_heatmap(year, month), limit_cache_timeout(REPORT_CACHE_TIMEOUT))
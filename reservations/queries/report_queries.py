@@ -1,12 +1,26 @@
-from reservations.models import Reservation
+from datetime import datetime, timedelta
+
+from reservations.models import Reservation, ReservationSeries, DailyReservationRollup
+from reservations.series import get_series_in_days, expand_series
 from django.db.models import Count, Sum, Q, F
+from django.db.models.query import QuerySet
+
+from middleapp.cache import get_or_build, get_range_version
+from middleapp.routers import limit_cache_timeout
+
+# How long (in seconds) a report is kept, it's rebuilt sooner when the data of its months changes
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+
+def as_date(day):
+    return day.date() if isinstance(day, datetime) else day
 
 
 def get_reservations_between_dates(date1, date2):
     return Reservation.objects.filter(day__range=[date1, date2])
 
 
-def get_most_paying_users(reservations_queryset, num_of_users=5):
+def get_most_paying_users(reservations_queryset, num_of_users=5, series_reservations=()):
     """
     this returns a list of dictionaries, like the following:
 
@@ -14,73 +28,152 @@ def get_most_paying_users(reservations_queryset, num_of_users=5):
                    'total_unpaid': 5092, 'total_paid': 2314, 'total_money': 7406},
                   {'user__full_name': 'Omar 2', 'user__phone': '0530000000','user__gender': 'M', 'res_count': 2,
                    'total_unpaid': 0, 'total_paid': 800, 'total_money': 800}, etc... ] >
-    """
-
-    return (reservations_queryset
-            .values('user__full_name', 'user__phone', 'user__gender')
-            .annotate(reservations_count=Count('user'))
-            .annotate(total_paid=Sum('price', default=0))
-            .order_by('-total_paid')
-            [:num_of_users]
-            )
 
+    :param series_reservations: The weeks of the series in the same days, see reservations/series.py
+    """
 
-def get_facilities_report(queryset):
+    users = (reservations_queryset
+             .values('user__full_name', 'user__phone', 'user__gender')
+             .annotate(reservations_count=Count('user'))
+             .annotate(total_paid=Sum('price', default=0))
+             .order_by('-total_paid'))
+    if not series_reservations:
+        return users[:num_of_users]
+
+    # only the top customers of the reservations and the customers of the series can be in the top after adding
+    # the weeks of the series to them
+    series_users = {reservation.user_id for reservation in series_reservations if reservation.user_id is not None}
+    rows = {}
+    for row in list(users[:num_of_users]) + list(users.filter(user_id__in=series_users)):
+        rows[(row['user__full_name'], row['user__phone'], row['user__gender'])] = row
+    for reservation in series_reservations:
+        if reservation.user is None:
+            continue
+        key = (reservation.user.full_name, reservation.user.phone, reservation.user.gender)
+        row = rows.setdefault(key, {'user__full_name': key[0], 'user__phone': key[1], 'user__gender': key[2],
+                                    'reservations_count': 0, 'total_paid': 0})
+        row['reservations_count'] += 1
+        row['total_paid'] += reservation.price
+    return sorted(rows.values(), key=lambda row: row['total_paid'], reverse=True)[:num_of_users]
+
+
+def get_rollups_between_dates(date1, date2):
+    return DailyReservationRollup.objects.filter(day__range=[date1, date2])
+
+
+def get_facilities_report(rollups_queryset):
     # get all the facilities ordered by the income they made
     # this returns a list of dictionaries, like the following:
     # < QuerySet[{'facility__name': 'Facility 1', 'reservations_count': 23, 'income_generated': 5092},
     #            {'facility__name': 'Facility 2', 'reservations_count': 2, 'income_generated': 800}, etc... ] >
 
-    return (queryset
+    return (rollups_queryset
             .values('facility__name')
-            .annotate(reservations_count=Count('facility'))
-            .annotate(income_generated=Sum('price', default=0))
+            .annotate(reservations_count=Sum('count', default=0))
+            .annotate(income_generated=Sum('income', default=0))
             .order_by('-income_generated'))
 
 
-def get_categories_report(queryset):
+def get_categories_report(rollups_queryset):
     # get all the categories ordered by the income they made
     # this returns a list of dictionaries, like the following:
     # < QuerySet[{'facility__category__name': 'Category 1', 'reservations_count': 23, 'income_generated': 5092},
 
-    return (queryset
+    return (rollups_queryset
             .values('facility__category__name')
-            .annotate(reservations_count=Count('facility__category'))
-            .annotate(income_generated=Sum('price', default=0))
+            .annotate(reservations_count=Sum('count', default=0))
+            .annotate(income_generated=Sum('income', default=0))
             .order_by('-income_generated'))
 
 
-def get_gender_report(queryset):
+def get_customers_count_by_gender(reservations_queryset, series_reservations=()):
+    # the unique customers can't be summed from the daily rollups, so they are counted from the reservations
+    # this returns a dictionary, like the following: {'M': 4, 'F': 2}
+
+    rows = (reservations_queryset
+            .values('user__gender')
+            .annotate(customers_count=Count('user', distinct=True))
+            .order_by())
+    customers_count = {row['user__gender']: row['customers_count'] for row in rows}
+
+    # add the customers of the series that have no reservation in the same days
+    series_users = {reservation.user_id: reservation.user.gender
+                    for reservation in series_reservations if reservation.user_id is not None}
+    if series_users:
+        counted = set(reservations_queryset.filter(user_id__in=series_users).values_list('user_id', flat=True))
+        for user_id, gender in series_users.items():
+            if user_id not in counted:
+                customers_count[gender] = customers_count.get(gender, 0) + 1
+    return customers_count
+
+
+def get_gender_report(rollups_queryset, customers_count_by_gender):
     # summarize the reservations based on the gender of the customer
     # this returns a list of dictionaries, like the following:
-    # < QuerySet[{'user__gender': 'M', 'reservations_count': 23, 'customers_count':4, 'income_generated': 5092},
+    # [{'user__gender': 'M', 'reservations_count': 23, 'customers_count':4, 'income_generated': 5092}, etc... ]
 
-    return (queryset.values('user__gender')
-            .annotate(reservations_count=Count('user__gender'))
-            .annotate(customers_count=Count('user', distinct=True))
-            .annotate(income_generated=Sum('price', default=0))
+    rows = (rollups_queryset.values('gender')
+            .annotate(reservations_count=Sum('count', default=0))
+            .annotate(income_generated=Sum('income', default=0))
             .order_by('-income_generated'))
+    return [{'user__gender': row['gender'], 'reservations_count': row['reservations_count'],
+             'customers_count': customers_count_by_gender.get(row['gender'], 0),
+             'income_generated': row['income_generated']}
+            for row in rows]
 
 
-
-def get_summary_report(reservations_queryset):
+def get_summary_report(rollups_queryset, customers_count_by_gender):
     # get the total number of reservations, the number of unique users, the total paid and the total unpaid
     # this returns a dictionary, like the following:
     # {'reservations_count': 25, 'users_count': 2, 'total_paid': 3114, 'total_unpaid': 5092}
 
-    return (reservations_queryset
-            .aggregate(reservations_count=Count('id'),
-                       users_count=Count('user', distinct=True),
-                       total_paid=Sum('price', default=0)))
+    summary = rollups_queryset.aggregate(reservations_count=Sum('count', default=0),
+                                         total_paid=Sum('income', default=0))
+    # every customer has one gender, so the unique customers of all the genders add up
+    summary['users_count'] = sum(customers_count_by_gender.values())
+    return summary
+
+
+def get_series_reservations_between_dates(date1, date2):
+    """
+    Get the weeks of the series between two dates (date objects) with their customers, see reservations/series.py
+    """
+    days = [date1 + timedelta(days=index) for index in range((date2 - date1).days + 1)]
+    series = ReservationSeries.objects.select_related('user')
+    return expand_series(get_series_in_days(days, series), days)
 
 
 def get_report_info(date1, date2):
     reservations = get_reservations_between_dates(date1, date2)
+    rollups = get_rollups_between_dates(date1, date2)
+    # the rollups already count the weeks of the series, the customers are counted from their weeks
+    series_reservations = get_series_reservations_between_dates(as_date(date1), as_date(date2))
+    customers_count_by_gender = get_customers_count_by_gender(reservations, series_reservations)
 
     return {
-        'reservations_report': get_summary_report(reservations),
-        'facilities_report': get_facilities_report(reservations),
-        'categories_report': get_categories_report(reservations),
-        'customers_report': get_most_paying_users(reservations, 5),
-        'gender_report': get_gender_report(reservations)
+        'reservations_report': get_summary_report(rollups, customers_count_by_gender),
+        'facilities_report': get_facilities_report(rollups),
+        'categories_report': get_categories_report(rollups),
+        'customers_report': get_most_paying_users(reservations, 5, series_reservations),
+        'gender_report': get_gender_report(rollups, customers_count_by_gender)
     }
+
+
+def get_cached_report_info(date1, date2):
+    """
+    Get the report of a range of days from the cache, it's rebuilt once the reservations of any of its months
+    change (see reservations/signals.py). The querysets of the report are evaluated to be cached.
+
+    :param date1: The first day of the report (a date or a datetime)
+    :param date2: The last day of the report (a date or a datetime)
+    :return: The same dictionary as get_report_info
+    """
+    date1 = as_date(date1)
+    date2 = as_date(date2)
+    key = f'reservations_report:{get_range_version("reservation_reports", date1, date2)}:{date1}:{date2}'
+
+    def build():
+        return {name: (list(report) if isinstance(report, QuerySet) else report)
+                for name, report in get_report_info(date1, date2).items()}
+
+    return get_or_build(key, build, limit_cache_timeout(REPORT_CACHE_TIMEOUT))
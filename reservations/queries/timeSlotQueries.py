@@ -2,6 +2,9 @@ from django.db.models.query import QuerySet
 from django.contrib.auth import get_user_model
 
 from reservations import models
+from reservations.occupancy import get_slot_bits, get_occupancy_masks, get_occupied_slot_ids, is_indexable
+from reservations.queries.availability_queries import to_date
+from reservations.series import get_series_in_days, expand_series
 
 
 def get_free_slots(facility: models.Facility, date: str) -> QuerySet:
@@ -12,7 +15,7 @@ def get_free_slots(facility: models.Facility, date: str) -> QuerySet:
     :param date: A string date (YYYY-MM-dd)
     :return: A QuerySet object, with all the free TimeSlots
     """
-    return models.TimeSlot.objects.filter(facility=facility).exclude(reservation__day=date)
+    return get_free_slots_in_dates(facility, [date])
 
 
 def get_weekly_free_slots(facility: models.Facility, initial_date: str, weeksNum: int) -> QuerySet:
@@ -31,7 +34,32 @@ def get_weekly_free_slots(facility: models.Facility, initial_date: str, weeksNum
     dates = get_dates_of_weekdays(initial_date, weeksNum)
 
     # Get the slots that are free for all the dates
-    return models.TimeSlot.objects.filter(facility=facility).exclude(reservation__day__in=dates)
+    return get_free_slots_in_dates(facility, dates)
+
+
+def get_free_slots_in_dates(facility: models.Facility, dates: list) -> QuerySet:
+    """
+    Get the time slots of a facility that are free in all the given dates, using the occupancy index:
+    the masks of the dates are OR-ed together, and the slots whose bits are not set are free
+
+    :param facility: A Facility object.
+    :param dates: A list of dates (date objects or YYYY-MM-dd strings)
+    :return: A QuerySet object, with the free TimeSlots
+    """
+    slots = models.TimeSlot.objects.filter(facility=facility)
+    slot_bits = get_slot_bits(slots.values_list('id', flat=True))
+
+    if not is_indexable(slot_bits):
+        days = [to_date(date) for date in dates]
+        series = get_series_in_days(days, models.ReservationSeries.objects.filter(time_slot__facility=facility))
+        series_slot_ids = {reservation.time_slot_id for reservation in expand_series(series, days)}
+        return slots.exclude(reservation__day__in=dates).exclude(pk__in=series_slot_ids)
+
+    occupied_mask = 0
+    for mask in get_occupancy_masks([facility.id], dates).values():
+        occupied_mask |= mask
+
+    return slots.exclude(pk__in=get_occupied_slot_ids(slot_bits, occupied_mask))
 
 
 def get_all_slots(facility: models.Facility) -> QuerySet:
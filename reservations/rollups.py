@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from reservations.models import DailyReservationRollup, Reservation, ReservationSeries
+from reservations.occupancy import lock_facility, group_days_by_facility
+from reservations.series import get_series_in_days, expand_series
+
+
+def get_rollups(reservations) -> list:
+    """
+    Sum a queryset of reservations per day, facility and customer gender
+
+    :return: A list of unsaved DailyReservationRollup objects
+    """
+    rows = (reservations
+            .values('day', 'facility_id', 'user__gender')
+            .annotate(reservations_count=Count('id'), income=Sum('price', default=0))
+            .order_by())
+    return [DailyReservationRollup(day=row['day'], facility_id=row['facility_id'], gender=row['user__gender'],
+                                   count=row['reservations_count'], income=row['income'])
+            for row in rows]
+
+
+def add_series_rollups(rollups, series_reservations) -> list:
+    """
+    Add the weeks of the series to a list of rollups, see get_rollups
+
+    :param rollups: A list of unsaved DailyReservationRollup objects
+    :param series_reservations: A list of the weeks of some series with their customers, see expand_series
+    :return: A list of unsaved DailyReservationRollup objects
+    """
+    rollups = {(rollup.day, rollup.facility_id, rollup.gender): rollup for rollup in rollups}
+    for reservation in series_reservations:
+        gender = reservation.user.gender if reservation.user is not None else None
+        key = (reservation.day, reservation.facility_id, gender)
+        rollup = rollups.setdefault(key, DailyReservationRollup(day=reservation.day, facility_id=reservation.facility_id,
+                                                                gender=gender, count=0, income=0))
+        rollup.count += 1
+        rollup.income += reservation.price
+    return list(rollups.values())
+
+
+def refresh_rollups(facility_id, days):
+    """
+    Recompute the rollups of a facility in the given days from its reservations and the weeks of its series.
+    This is called whenever a reservation or a series is created, moved or deleted.
+
+    :param facility_id: The id of a Facility, None for the reservations of deleted facilities
+    :param days: A list of date objects
+    """
+    days = set(days)
+    if facility_id is None:
+        reservations = Reservation.objects.filter(facility__isnull=True, day__in=days)
+        series = ReservationSeries.objects.filter(facility__isnull=True)
+        stale = DailyReservationRollup.objects.filter(facility__isnull=True, day__in=days)
+    else:
+        reservations = Reservation.objects.filter(facility_id=facility_id, day__in=days)
+        series = ReservationSeries.objects.filter(facility_id=facility_id)
+        stale = DailyReservationRollup.objects.filter(facility_id=facility_id, day__in=days)
+
+    with transaction.atomic():
+        # the rows are read and replaced under the facility's lock, the rows without a facility have no lock
+        lock_facility(facility_id)
+        series_reservations = expand_series(get_series_in_days(days, series.select_related('user')), days)
+        rollups = add_series_rollups(get_rollups(reservations), series_reservations)
+        stale.delete()
+        DailyReservationRollup.objects.bulk_create(rollups)
+
+
+def refresh_rollups_for_keys(keys):
+    """
+    Refresh the rollups of a group of (facility_id, day) pairs, with one refresh per facility
+    """
+    for facility_id, days in group_days_by_facility(keys):
+        refresh_rollups(facility_id, days)
+
+
+def rebuild_rollups():
+    """
+    Rebuild all the rollups from the reservations and the weeks of the series
+    """
+    series = ReservationSeries.objects.select_related('user').prefetch_related('exceptions')
+    rollups = add_series_rollups(get_rollups(Reservation.objects.all()), expand_series(series))
+    with transaction.atomic():
+        DailyReservationRollup.objects.all().delete()
+        DailyReservationRollup.objects.bulk_create(rollups, batch_size=1000)
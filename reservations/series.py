@@ -0,0 +1,44 @@
+from reservations.models import ReservationSeries
+
+
+def get_series_in_days(days, series=None):
+    """
+    Get the series that may have a week in the given days: the ones that run during them on one of their weekdays.
+    Their cancelled weeks are prefetched for expand_series.
+    Ex: to get the weeks of a facility's series on 2023-08-21, call:
+        expand_series(get_series_in_days([day], ReservationSeries.objects.filter(facility=facility)), [day])
+
+    :param days: A list of date objects
+    :param series: A queryset of ReservationSeries to filter, all the series by default
+    :return: A queryset of ReservationSeries
+    """
+    days = set(days)
+    series = ReservationSeries.objects.all() if series is None else series
+    if not days:
+        return series.none()
+
+    # __week_day numbers the days from 1 (Sunday) to 7 (Saturday)
+    weekdays = {day.isoweekday() % 7 + 1 for day in days}
+    return (series
+            .filter(start_day__lte=max(days), end_day__gte=min(days), start_day__week_day__in=weekdays)
+            .prefetch_related('exceptions'))
+
+
+def expand_series(series, days=None):
+    """
+    Expand the weeks of the given series into reservations, without the cancelled weeks
+
+    :param series: An iterable of ReservationSeries, with their exceptions prefetched (see get_series_in_days)
+    :param days: A list of date objects, defaults to all the weeks of the series
+    :return: A list of unsaved Reservation objects ordered by day, see ReservationSeries.occurrence
+    """
+    days = None if days is None else sorted(set(days))
+
+    reservations = []
+    for one_series in series:
+        cancelled = {exception.day for exception in one_series.exceptions.all()}
+        series_days = one_series.get_days() if days is None else [day for day in days if one_series.occurs_on(day)]
+        reservations.extend(one_series.occurrence(day) for day in series_days if day not in cancelled)
+
+    reservations.sort(key=lambda reservation: reservation.day)
+    return reservations
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from middleapp.cache import bump_cache_version_on_commit, bump_month_versions_on_commit
+from middleapp.images import update_image_variants_on_save
+from reservations.events import publish_reservation_changes
+from reservations.models import Reservation, ReservationSeries, ReservationSeriesException, TimeSlot, Facility, \
+    FacilityCategory
+from reservations.occupancy import refresh_occupancy_for_keys, rebuild_occupancy
+from reservations.rollups import refresh_rollups, refresh_rollups_for_keys
+
+
+def reservations_changed(keys, action='changed'):
+    """
+    Update everything that is derived from the reservations of the given (facility_id, day) pairs.
+    It's called by the reservation and series signals below, and by the customer handlers (update_customer_rollups,
+    move_customer_rollups) for all the reservations of a customer whose gender changed or who was deleted.
+
+    :param action: How the reservations changed, sent to the front desk screens (see reservations/events.py)
+    """
+    refresh_occupancy_for_keys(keys)
+    refresh_rollups_for_keys(keys)
+    # the cached pages and reports are rebuilt once the change is committed, the derived tables above within it
+    bump_cache_version_on_commit('reservations')
+    bump_month_versions_on_commit('reservation_reports', [day for _, day in keys])
+    for facility_id in {facility_id for facility_id, _ in keys if facility_id is not None}:
+        bump_availability_version(facility_id)
+    publish_reservation_changes(keys, action)
+
+
+# How long (in seconds) the availability version of a facility is kept. The workers don't share the versions
+# of a LocMem cache, so a worker misses the bumps of the others, this gives its ETags a new version after a while
+AVAILABILITY_VERSION_TIMEOUT = getattr(settings, 'AVAILABILITY_VERSION_TIMEOUT', 60)
+
+
+def get_availability_version_name(facility_id):
+    return f'availability:{facility_id}'
+
+
+def bump_availability_version(facility_id):
+    # the ETags of the facility's availability change with it, see reservations/views/api_views.py.
+    # it's bumped once the change is committed, a client that reads the version before that would keep the old data
+    bump_cache_version_on_commit(get_availability_version_name(facility_id), AVAILABILITY_VERSION_TIMEOUT)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def update_reservation_derived_data(sender, instance, created=None, **kwargs):
+    # update both the day the reservation was loaded with and the new one, in case it was moved
+    if created is None:
+        action = 'deleted'
+    else:
+        action = 'created' if created else 'updated'
+    reservations_changed(instance.affected_keys, action)
+    instance._loaded_key = (instance.facility_id, instance.day)
+
+
+@receiver(post_save, sender=ReservationSeries)
+@receiver(post_delete, sender=ReservationSeries)
+def update_series_derived_data(sender, instance, created=None, **kwargs):
+    # the weeks of a series aren't rows, so all of them are updated from the series at once
+    if created is None:
+        action = 'deleted'
+    else:
+        action = 'created' if created else 'updated'
+    reservations_changed(instance.affected_keys, action)
+    instance._loaded_keys = {(instance.facility_id, day) for day in instance.get_days()}
+
+
+@receiver(post_save, sender=ReservationSeriesException)
+@receiver(post_delete, sender=ReservationSeriesException)
+def update_series_week_derived_data(sender, instance, created=None, **kwargs):
+    # an exception cancels a week of its series, deleting the exception gives the week back
+    facility_id = ReservationSeries.objects.filter(pk=instance.series_id).values_list('facility_id', flat=True).first()
+    reservations_changed({(facility_id, instance.day)}, 'deleted' if created is not None else 'created')
+
+
+@receiver(post_delete, sender=TimeSlot)
+def rebuild_facility_occupancy(sender, instance, **kwargs):
+    # deleting a slot moves the bits of the slots that come after it
+    if instance.facility_id is not None:
+        rebuild_occupancy([instance.facility_id])
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def invalidate_slots_availability(sender, instance, **kwargs):
+    if instance.facility_id is not None:
+        bump_availability_version(instance.facility_id)
+    # the occupancy heatmaps count the slots of every month, see reservations/queries/heatmap_queries.py
+    bump_cache_version_on_commit('time_slots')
+
+
+@receiver(post_save, sender=Facility)
+def invalidate_facility_availability(sender, instance, **kwargs):
+    # the availability shows the facility's name
+    bump_availability_version(instance.pk)
+
+
+@receiver(pre_delete, sender=Facility)
+def remember_facility_days(sender, instance, **kwargs):
+    instance._reserved_days = set(Reservation.objects.filter(facility=instance).values_list('day', flat=True))
+    for series in ReservationSeries.objects.filter(facility=instance):
+        instance._reserved_days.update(series.get_days())
+
+
+@receiver(post_delete, sender=Facility)
+def move_facility_rollups(sender, instance, **kwargs):
+    # the facility's rollups were deleted with it, while its reservations were kept without a facility
+    days = getattr(instance, '_reserved_days', None)
+    if days:
+        refresh_rollups(None, days)
+        bump_cache_version_on_commit('reservations')
+        bump_month_versions_on_commit('reservation_reports', days)
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+@receiver(post_save, sender=FacilityCategory)
+@receiver(post_delete, sender=FacilityCategory)
+def invalidate_reservation_reports(sender, instance, **kwargs):
+    # the reports of every month show the names of the facilities and their categories
+    bump_cache_version_on_commit('reservation_reports')
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+@receiver(post_save, sender=FacilityCategory)
+@receiver(post_delete, sender=FacilityCategory)
+def invalidate_facilities(sender, instance, **kwargs):
+    # the occupancy heatmaps list the facilities that aren't suspended, grouped by their categories
+    bump_cache_version_on_commit('facilities')
+
+
+post_save.connect(update_image_variants_on_save, sender=Facility)
+
+
+def get_customer_keys(user):
+    keys = set(Reservation.objects.filter(user=user).values_list('facility_id', 'day').distinct())
+    for series in ReservationSeries.objects.filter(user=user):
+        keys.update(series.affected_keys)
+    return keys
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_customer_rollups(sender, instance, created, update_fields=None, **kwargs):
+    # the rollups are split by the customers' gender, which can be edited.
+    # a customer that wasn't loaded from the database (no _loaded_gender) may have changed it
+    if update_fields is not None and 'gender' not in update_fields:
+        return
+    loaded_gender = getattr(instance, '_loaded_gender', None)
+    instance._loaded_gender = instance.gender
+    if created or loaded_gender == instance.gender:
+        return
+    keys = get_customer_keys(instance)
+    if keys:
+        reservations_changed(keys)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remember_customer_keys(sender, instance, **kwargs):
+    instance._reserved_keys = get_customer_keys(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def move_customer_rollups(sender, instance, **kwargs):
+    # the customer's reservations were kept without a customer, so they move to the rows without a gender
+    keys = getattr(instance, '_reserved_keys', None)
+    if keys:
+        reservations_changed(keys)
@@ -0,0 +1,24 @@
+// Reload the page when the reservations it shows change, instead of refreshing it by hand.
+// The events come from the server-sent event stream in the data-events-url attribute of the script tag,
+// ex: <script src="live_updates.js" data-events-url="/events/reservations?day=2023-08-21"></script>
+(function () {
+    const eventsUrl = document.currentScript.dataset.eventsUrl;
+    if (!window.EventSource || !eventsUrl) {
+        return;
+    }
+
+    let reloadTimer = null;
+    function reload() {
+        // the screens that got the same event don't all reload at the same moment
+        if (reloadTimer === null) {
+            reloadTimer = setTimeout(function () {
+                window.location.reload();
+            }, 500 + Math.random() * 1000);
+        }
+    }
+
+    const source = new EventSource(eventsUrl);
+    ['created', 'updated', 'deleted', 'changed', 'reload'].forEach(function (name) {
+        source.addEventListener(name, reload);
+    });
+})();
@@ -1,3 +1,339 @@
+from datetime import date, time, timedelta
+
+import pytz
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.query import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 # Create your tests here.
+from middleapp.cache import get_version_key
+from middleapp.testing import QueryBudgetMixin
+from reservations import queries
+from reservations.queries.board_queries import get_business_day, BUSINESS_DAY_CUTOFF
+from reservations.models import Facility, FacilityCategory, TimeSlot, Reservation, ReservationSeries, \
+    FacilityDayOccupancy, DailyReservationRollup
+from reservations.signals import get_availability_version_name
+from reservations.utilities import get_reservation_queryset_from_params, create_reservation_series, \
+    save_reservation, save_reservation_series, cancel_series_week, restore_series_week, ReservationConflictError
+from users.models import RSUser
+
+
+class QueryPlanTests(TestCase):
+    """
+    Run every query in reservations/queries and fail if SQLite plans a full scan of a hot table for it.
+    A full scan shows up as "SCAN <table>" in EXPLAIN QUERY PLAN, while using an index shows up as "SEARCH <table>".
+    """
+
+    # The tables that grow with every booking, the others are small enough to be read whole
+    HOT_TABLES = ['reservations_reservation', 'reservations_facilitydayoccupancy',
+                  'reservations_dailyreservationrollup']
+
+    @classmethod
+    def setUpTestData(cls):
+        category = FacilityCategory.objects.create(name='كرة قدم')
+        cls.facility = Facility.objects.create(name='الملعب 1', category=category)
+        cls.slot = TimeSlot.objects.create(facility=cls.facility, start_time=time(16), end_time=time(17))
+        cls.user = RSUser.objects.create_user(phone='0500000000', password='password', full_name='عميل',
+                                              gender='M')
+        Reservation.objects.create(user=cls.user, facility=cls.facility, time_slot=cls.slot, day=date(2023, 8, 21),
+                                   price=100)
+
+    def get_full_scans(self, function, *args):
+        with CaptureQueriesContext(connection) as context:
+            result = function(*args)
+            # evaluate the lazy querysets, the reports return a dictionary of them
+            for value in (result.values() if isinstance(result, dict) else [result]):
+                if isinstance(value, QuerySet):
+                    list(value)
+
+        scans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if not query['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    # "SCAN table USING INDEX ..." still reads the whole table in the index order
+                    if any(detail.startswith(f'SCAN {table}') for table in self.HOT_TABLES):
+                        scans.append((query['sql'], detail))
+        return scans
+
+    def assertUsesIndexes(self, function, *args):
+        scans = self.get_full_scans(function, *args)
+        self.assertEqual(scans, [], f'{function.__name__} scans a whole table')
+
+    def test_time_slot_queries(self):
+        self.assertUsesIndexes(queries.get_free_slots, self.facility, '2023-08-21')
+        self.assertUsesIndexes(queries.get_weekly_free_slots, self.facility, '2023-08-21', 52)
+        self.assertUsesIndexes(queries.get_all_slots, self.facility)
+
+    def test_availability_queries(self):
+        self.assertUsesIndexes(queries.get_availability_grid, ['2023-08-21', '2023-08-22'])
+        self.assertUsesIndexes(queries.get_availability_grid, ['2023-08-21'], [self.facility])
+
+    def test_board_queries(self):
+        self.assertUsesIndexes(queries.board_queries.compute_business_day_board, date(2023, 8, 21))
+
+    def test_report_queries(self):
+        self.assertUsesIndexes(queries.get_report_info, date(2023, 8, 1), date(2023, 8, 31))
+
+    def test_reservation_search_queries(self):
+        searches = [
+            {'searchByDay': 'exact', 'day': '2023-08-21'},
+            {'searchByDay': 'range', 'dayFrom': '2023-08-01', 'dayTo': '2023-08-31'},
+            {'searchByDay': 'after', 'day': '2023-08-21', 'facility': str(self.facility.id)},
+            {'searchByDay': 'before', 'day': '2023-08-21', 'user': str(self.user.id)},
+        ]
+        for params in searches:
+            with self.subTest(params=params):
+                self.assertUsesIndexes(get_reservation_queryset_from_params, Reservation.objects.all(), params)
+
+
+class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    The query budgets of the list pages of the reservations, see QueryBudgetMixin
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = RSUser.objects.create_superuser(phone='0500000001', password='password', full_name='مدير',
+                                                    gender='M')
+        cls.customers = [RSUser.objects.create_user(phone=f'05100000{i:02}', password='password',
+                                                    full_name=f'عميل {i}', gender='M') for i in range(6)]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_facility(self, index):
+        category = FacilityCategory.objects.create(name=f'فئة {index}')
+        return Facility.objects.create(name=f'الملعب {index}', category=category)
+
+    def add_reservations(self, day, count, start_time=time(16), end_time=time(17)):
+        for index in range(count):
+            facility = self.add_facility(index)
+            slot = TimeSlot.objects.create(facility=facility, start_time=start_time, end_time=end_time)
+            Reservation.objects.create(user=self.customers[index], facility=facility, time_slot=slot, day=day,
+                                       price=100)
+
+    def test_facilities_list(self):
+        def add_facilities(count):
+            for index in range(count):
+                self.add_facility(index)
+
+        self.assertQueryBudget('/facilities', add_facilities, 8)
+
+    def test_reservations_search(self):
+        def add_reservations(count):
+            self.add_reservations(date(2023, 8, 21), count)
+
+        self.assertQueryBudget('/reservations?searchByDay=exact&day=2023-08-21', add_reservations, 10)
+
+    def test_reservations_board(self):
+        now = timezone.now().astimezone(pytz.timezone('Asia/Riyadh'))
+
+        def add_reservations(count):
+            # the slots run for the whole business day, so they're on the board at any time of the day
+            self.add_reservations(get_business_day(now), count, BUSINESS_DAY_CUTOFF, BUSINESS_DAY_CUTOFF)
+
+        self.assertQueryBudget('/', add_reservations, 8)
+
+    def test_series_list(self):
+        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+
+        def add_series(count):
+            for index in range(count):
+                facility = self.add_facility(index)
+                slot = TimeSlot.objects.create(facility=facility, start_time=time(16), end_time=time(17))
+                create_reservation_series(facility, today, self.customers[index], slot, 100, 4)
+
+        self.assertQueryBudget('/series', add_series, 8)
+
+
+class ReservationSeriesTests(TestCase):
+    """
+    A series books its time slot in every one of its weeks without a row per week, so the single bookings,
+    the occupancy masks and the rollups have to see its weeks as if they were reservations.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = RSUser.objects.create_superuser(phone='0500000001', password='password', full_name='مدير',
+                                                    gender='M')
+        cls.customer = RSUser.objects.create_user(phone='0500000002', password='password', full_name='عميل',
+                                                  gender='F')
+        cls.facility = Facility.objects.create(name='الملعب 1')
+        cls.slot = TimeSlot.objects.create(facility=cls.facility, start_time=time(16), end_time=time(17))
+        cls.day = date(2023, 8, 21)
+
+    def week(self, number, start=None):
+        return (start or self.day) + timedelta(weeks=number)
+
+    def book(self, day):
+        return save_reservation(Reservation(user=self.customer, facility=self.facility, time_slot=self.slot, day=day,
+                                            price=50))
+
+    def get_mask(self, day):
+        mask = (FacilityDayOccupancy.objects
+                .filter(facility=self.facility, day=day)
+                .values_list('mask', flat=True)
+                .first())
+        return mask or 0
+
+    def get_rollup(self, day):
+        totals = DailyReservationRollup.objects.filter(day=day).aggregate(count=Sum('count'), income=Sum('income'))
+        return totals['count'] or 0, totals['income'] or 0
+
+    def test_single_booking_refused_on_series_week(self):
+        create_reservation_series(self.facility, self.day, self.customer, self.slot, 100, 4)
+
+        with self.assertRaises(ReservationConflictError) as context:
+            self.book(self.week(2))
+        self.assertEqual(set(context.exception.dates), {self.week(2)})
+        self.assertFalse(Reservation.objects.exists())
+
+        # the days between the weeks are free
+        self.book(self.week(2) + timedelta(days=1))
+
+    def test_restore_refused_after_booking_cancelled_week(self):
+        series = create_reservation_series(self.facility, self.day, self.customer, self.slot, 100, 4)
+
+        cancel_series_week(series, self.week(1))
+        self.book(self.week(1))
+
+        with self.assertRaises(ReservationConflictError):
+            restore_series_week(series, self.week(1))
+        self.assertTrue(series.exceptions.filter(day=self.week(1)).exists())
+
+    def test_extend_and_shrink(self):
+        series = create_reservation_series(self.facility, self.day, self.customer, self.slot, 100, 4)
+        self.book(self.week(5))
+
+        # extending over a booked week is refused and the series is kept as it was
+        series.end_day = self.week(5)
+        with self.assertRaises(ReservationConflictError) as context:
+            save_reservation_series(series)
+        self.assertEqual(set(context.exception.dates), {self.week(5)})
+        self.assertEqual(ReservationSeries.objects.get().end_day, self.week(3))
+
+        # shrinking frees the cut weeks and drops their exceptions
+        series = ReservationSeries.objects.get()
+        cancel_series_week(series, self.week(3))
+        series.end_day = self.week(1)
+        save_reservation_series(series)
+        self.assertFalse(series.exceptions.exists())
+        self.book(self.week(2))
+
+    def test_occupancy_and_rollups(self):
+        series = create_reservation_series(self.facility, self.day, self.customer, self.slot, 100, 3)
+        for number in range(3):
+            self.assertEqual(self.get_mask(self.week(number)), 1)
+            self.assertEqual(self.get_rollup(self.week(number)), (1, 100))
+
+        cancel_series_week(series, self.week(1))
+        self.assertEqual(self.get_mask(self.week(1)), 0)
+        self.assertEqual(self.get_rollup(self.week(1)), (0, 0))
+
+        restore_series_week(series, self.week(1))
+        self.assertEqual(self.get_mask(self.week(1)), 1)
+        self.assertEqual(self.get_rollup(self.week(1)), (1, 100))
+
+    def test_rollups_follow_the_customer_gender(self):
+        create_reservation_series(self.facility, self.day, self.customer, self.slot, 100, 2)
+        customer = RSUser.objects.get(pk=self.customer.pk)
+
+        # saving the customer without changing the gender leaves the rollups alone
+        customer.full_name = 'عميل جديد'
+        with CaptureQueriesContext(connection) as context:
+            customer.save()
+        self.assertFalse([query for query in context.captured_queries if 'rollup' in query['sql']])
+
+        customer.gender = 'M'
+        customer.save()
+        self.assertEqual(list(DailyReservationRollup.objects.values_list('gender', flat=True).distinct()), ['M'])
+
+    def test_delete_keeps_past_weeks(self):
+        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+        start = self.week(-2, today)
+        series = create_reservation_series(self.facility, start, self.customer, self.slot, 100, 4)
+        self.client.force_login(self.admin)
+
+        # the past weeks can't be cancelled or cut
+        self.client.post(f'/series/{series.pk}/week', {'day': start.isoformat(), 'action': 'cancel'})
+        self.assertFalse(series.exceptions.exists())
+        response = self.client.post(f'/series/{series.pk}/update', {'user': self.customer.id, 'weeksNumber': 1})
+        self.assertContains(response, 'الأسابيع الماضية')
+        self.assertEqual(ReservationSeries.objects.get().end_day, self.week(3, start))
+
+        self.client.post(f'/series/{series.pk}/delete')
+        self.assertEqual(ReservationSeries.objects.get().end_day, self.week(1, start))
+        for number in range(2):
+            self.assertEqual(self.get_mask(self.week(number, start)), 1)
+            self.assertEqual(self.get_rollup(self.week(number, start)), (1, 100))
+        for number in range(2, 4):
+            self.assertEqual(self.get_mask(self.week(number, start)), 0)
+            self.assertEqual(self.get_rollup(self.week(number, start)), (0, 0))
+
+        # a series that didn't start yet is deleted
+        series = create_reservation_series(self.facility, self.week(1, today), self.customer, self.slot, 100, 2)
+        self.client.post(f'/series/{series.pk}/delete')
+        self.assertFalse(ReservationSeries.objects.filter(pk=series.pk).exists())
+
+
+class AvailabilityETagTests(TestCase):
+    """
+    The availability endpoint answers 304 while the facility's availability didn't change,
+    and a new ETag once a change of its reservations is committed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = RSUser.objects.create_superuser(phone='0500000001', password='password', full_name='مدير',
+                                                    gender='M')
+        cls.facility = Facility.objects.create(name='الملعب 1')
+        cls.slot = TimeSlot.objects.create(facility=cls.facility, start_time=time(16), end_time=time(17))
+        cls.url = f'/api/facilities/{cls.facility.pk}/availability?start=2023-08-21&end=2023-08-27'
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, **headers)
+
+    def book(self):
+        Reservation.objects.create(user=self.admin, facility=self.facility, time_slot=self.slot,
+                                   day=date(2023, 8, 22), price=100)
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_new_etag_after_commit(self):
+        etag = self.get().headers['ETag']
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book()
+            # the booking isn't committed yet, so the clients keep their copy
+            self.assertEqual(self.get(etag).status_code, 304)
+
+        for callback in callbacks:
+            callback()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertFalse(response.json()['days'][1]['slots'][0]['free'])
+
+    def test_new_etag_after_version_expires(self):
+        etag = self.get().headers['ETag']
+        cache.delete(get_version_key(get_availability_version_name(self.facility.pk)))
+        self.assertEqual(self.get(etag).status_code, 200)
@@ -18,15 +18,24 @@ urlpatterns = [
     path('updateReservation/<int:pk>', UpdateReservationWizardView.as_view(), name='update-reservation'),
     path('deleteReservation/<int:pk>', ReservationDeleteView.as_view(), name='delete-reservation'),
     path('createweeklyreservation', CreateWeeklyReservationWizardView.as_view(), name='create-weekly-reservation'),
+    path('series', ReservationSeriesListView.as_view(), name='series-list'),
+    path('series/<int:pk>', ReservationSeriesDetailView.as_view(), name='get-series'),
+    path('series/<int:pk>/update', ReservationSeriesUpdateView.as_view(), name='update-series'),
+    path('series/<int:pk>/delete', ReservationSeriesDeleteView.as_view(), name='delete-series'),
+    path('series/<int:pk>/week', ReservationSeriesWeekView.as_view(), name='series-week'),
 
     path('freeslots/<str:day>', FreeSlotsView.as_view(), name='free-slots'),
+    path('api/facilities/<int:pk>/availability', get_facility_availability_view, name='facility-availability'),
 
     path('summaryreport', SummaryReportView.as_view(), name='summary-report'),
     path('recordsReport', ReservationsRecordsView.as_view(), name='records-report'),
+    path('reservations/export', ReservationsExportView.as_view(), name='reservations-export'),
     path('choosereport', ChooseReportView.as_view(), name='choose-report'),
     path('choosereportstaff', ChooseReportViewStaff.as_view(), name='choose-report-staff'),
+    path('occupancy', OccupancyHeatmapView.as_view(), name='occupancy-heatmap'),
 
     path('invoice/<int:pk>', GenerateInvoiceView.as_view(), name='generate-invoice'),
+    path('series/<int:pk>/invoice/<str:day>', GenerateSeriesInvoiceView.as_view(), name='generate-series-invoice'),
 
 
 ]
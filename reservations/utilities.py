@@ -1,7 +1,13 @@
 from datetime import datetime, timedelta
+import heapq
+import time
 import pytz
 
-from reservations.models import Reservation, Facility, TimeSlot
+from django.db import transaction, IntegrityError, OperationalError
+
+from reservations.models import Reservation, ReservationSeries, TimeSlot
+from reservations.queries import get_availability_grid
+from reservations.series import get_series_in_days, expand_series
 
 
 def get_reservation_queryset_from_params(queryset, params):
@@ -73,6 +79,95 @@ def get_reservation_queryset_from_params(queryset, params):
     return queryset
 
 
+def get_series_queryset_from_params(queryset, params):
+    """
+    Get a queryset of the series that have weeks in the results of a search, with the same parameters
+    as get_reservation_queryset_from_params. Their weeks are filtered by day with get_day_filter_from_params.
+
+    :param queryset: A queryset of ReservationSeries
+    :param params: A dictionary of parameters
+    :return: A queryset of ReservationSeries
+    """
+    params = validate_reservation_search_params(params)
+
+    if params['searchByFacility'] == 'facility':
+        if params['facility'] is not None:
+            queryset = queryset.filter(facility=params['facility'])
+
+    elif params['searchByFacility'] == 'category':
+        if params['category'] is not None:
+            queryset = queryset.filter(facility__category=params['category'])
+
+    if params['user'] is not None:
+        queryset = queryset.filter(user=params['user'])
+
+    if params['gender'] == 'male':
+        queryset = queryset.filter(user__gender='M')
+
+    elif params['gender'] == 'female':
+        queryset = queryset.filter(user__gender='F')
+
+    # only the series that run during the searched days
+    if params['searchByDay'] == 'exact':
+        if params['day'] is not None:
+            queryset = queryset.filter(start_day__lte=params['day'], end_day__gte=params['day'])
+
+    elif params['searchByDay'] == 'range':
+        if params['dayFrom'] is not None and params['dayTo'] is not None:
+            queryset = queryset.filter(start_day__lte=params['dayTo'], end_day__gte=params['dayFrom'])
+
+    elif params['searchByDay'] == 'before':
+        if params['day'] is not None:
+            queryset = queryset.filter(start_day__lte=params['day'])
+
+    elif params['searchByDay'] == 'after':
+        if params['day'] is not None:
+            queryset = queryset.filter(end_day__gte=params['day'])
+
+    if params['searchByPrice'] == 'exact':
+        if params['price'] is not None:
+            queryset = queryset.filter(price=params['price'])
+
+    elif params['searchByPrice'] == 'range':
+        if params['priceFrom'] is not None and params['priceTo'] is not None:
+            queryset = queryset.filter(price__range=[params['priceFrom'], params['priceTo']])
+
+    elif params['searchByPrice'] == 'less':
+        if params['price'] is not None:
+            queryset = queryset.filter(price__lt=params['price'])
+
+    elif params['searchByPrice'] == 'greater':
+        if params['price'] is not None:
+            queryset = queryset.filter(price__gt=params['price'])
+
+    return queryset.select_related('user', 'facility__category', 'time_slot').prefetch_related('exceptions')
+
+
+def get_day_filter_from_params(params):
+    """
+    Get a function that tells if a week of a series is in the searched days, see get_series_queryset_from_params
+
+    :param params: A dictionary of parameters
+    :return: A function that takes a date object and returns True or False
+    """
+    params = validate_reservation_search_params(params)
+    day = params['day']
+
+    if params['searchByDay'] == 'exact' and day is not None:
+        return lambda week_day: week_day == day
+
+    elif params['searchByDay'] == 'range' and params['dayFrom'] is not None and params['dayTo'] is not None:
+        return lambda week_day: params['dayFrom'] <= week_day <= params['dayTo']
+
+    elif params['searchByDay'] == 'before' and day is not None:
+        return lambda week_day: week_day <= day
+
+    elif params['searchByDay'] == 'after' and day is not None:
+        return lambda week_day: week_day >= day
+
+    return lambda week_day: True
+
+
 def validate_reservation_search_params(params):
     validated_params = {}
 
@@ -161,27 +256,191 @@ def get_dates_of_weekdays(initial_date: str, weeksNum: int) -> list[datetime.dat
     return dates
 
 
-def createMultipleReservations(facility, initialDay, user, time_slot, price, weeksNum):
+class ReservationConflictError(Exception):
+    """
+    Raised when a time slot is already reserved in some of the days of a new reservation
+    """
+
+    def __init__(self, dates):
+        self.dates = sorted(dates)
+        super().__init__(f'The time slot is already reserved in: {", ".join(str(date) for date in self.dates)}')
+
+
+def with_optimistic_retry(operation, attempts=3):
+    """
+    Run a database write without waiting on the other bookings beforehand. The uniqueness of the reserved slots is
+    left to the database, and the write is retried with a short backoff only when the database reports a transient
+    lock (like SQLite's "database is locked"), so parallel bookings of different slots never wait on each other.
+
+    :param operation: A function that does the write
+    :param attempts: The number of times to try the write
+    :return: The return value of the operation
     """
-    Create multiple reservations for a given facility, user, time slot, price, is_paid, day and number of weeks
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def lock_time_slot(time_slot):
+    """
+    Lock the row of a time slot until the end of the transaction. The weeks of the series aren't rows that the
+    unique constraint of the reservations can see, so the writes that check them are serialized per time slot.
+    SQLite has no row locks, its writes are already serialized.
+    """
+    if time_slot is not None:
+        list(TimeSlot.objects.select_for_update().filter(pk=time_slot.pk).values_list('pk', flat=True))
+
+
+def get_series_conflicting_dates(time_slot, dates, exclude=None):
+    """
+    Get the dates in which a time slot is reserved by the weeks of a series
+
+    :param exclude: A ReservationSeries whose weeks are ignored, ex: the series that is being extended
+    """
+    series = ReservationSeries.objects.filter(time_slot=time_slot)
+    if exclude is not None:
+        series = series.exclude(pk=exclude.pk)
+    return {reservation.day for reservation in expand_series(get_series_in_days(dates, series), dates)}
+
+
+def get_conflicting_dates(time_slot, dates, exclude=None):
+    """
+    Get the dates in which a time slot is already reserved, by a reservation or by the week of a series
+
+    :param exclude: A Reservation or a ReservationSeries that is ignored, ex: the one that is being moved
+    """
+    conflicts = Reservation.objects.filter(time_slot=time_slot, day__in=dates)
+    if isinstance(exclude, Reservation):
+        conflicts = conflicts.exclude(pk=exclude.pk)
+    series = exclude if isinstance(exclude, ReservationSeries) else None
+    return set(conflicts.values_list('day', flat=True)) | get_series_conflicting_dates(time_slot, dates, series)
+
+
+def save_reservation(reservation):
+    """
+    Save a new or moved reservation. If another reservation took its time slot in the same day first,
+    the database refuses the duplicate and a ReservationConflictError is raised instead.
+
+    :param reservation: A Reservation object
+    :return: The saved Reservation object
+    :raises ReservationConflictError: if the time slot is already reserved in that day
+    """
+
+    def save():
+        try:
+            with transaction.atomic():
+                lock_time_slot(reservation.time_slot)
+                if get_series_conflicting_dates(reservation.time_slot, [reservation.day]):
+                    raise ReservationConflictError([reservation.day])
+                reservation.save()
+        except IntegrityError:
+            if get_conflicting_dates(reservation.time_slot, [reservation.day], exclude=reservation):
+                raise ReservationConflictError([reservation.day])
+            raise
+        return reservation
+
+    return with_optimistic_retry(save)
+
+
+def create_reservation_series(facility, initialDay, user, time_slot, price, weeksNum):
+    """
+    Create a weekly reservation for a given facility, user, time slot, price, first day and number of weeks.
+    It's stored as one ReservationSeries, whose weeks are expanded when they're read (see reservations/series.py).
 
     :param facility: A Facility object
+    :param initialDay: A string date (YYYY-MM-dd) or a date object
     :param user: A User object
     :param time_slot: A TimeSlot object
-    :param price: A float price
-    :param initialDay: A string date (YYYY-MM-dd)
+    :param price: The price of every week
     :param weeksNum: An integer number of weeks
-    :return: A list of Reservation objects
+    :return: A ReservationSeries object
+    :raises ReservationConflictError: with every date in which the time slot is already reserved
     """
-
-    reservations = []
     dates = get_dates_of_weekdays(initialDay, weeksNum)
-    for date in dates:
-        reservation = Reservation.objects.create(facility=facility, user=user, time_slot=time_slot, price=price,
-                                                 day=date)
-        reservation.save()
-        reservations.append(reservation)
-    return reservations
+
+    def create():
+        with transaction.atomic():
+            lock_time_slot(time_slot)
+            conflicts = get_conflicting_dates(time_slot, dates)
+            if conflicts:
+                raise ReservationConflictError(conflicts)
+
+            return ReservationSeries.objects.create(facility=facility, user=user, time_slot=time_slot, price=price,
+                                                    start_day=dates[0], end_day=dates[-1])
+
+    return with_optimistic_retry(create)
+
+
+def save_reservation_series(series):
+    """
+    Save the changes of a series, after checking that its new weeks are still free.
+    Only the series' row is written, no matter how many weeks it has.
+
+    :param series: A ReservationSeries object
+    :return: The saved ReservationSeries object
+    :raises ReservationConflictError: with every date in which the time slot is already reserved
+    """
+    loaded_days = {day for _, day in getattr(series, '_loaded_keys', set())}
+    new_days = [day for day in series.get_days() if day not in loaded_days]
+
+    def save():
+        with transaction.atomic():
+            lock_time_slot(series.time_slot)
+            conflicts = get_conflicting_dates(series.time_slot, new_days, exclude=series) if new_days else set()
+            if conflicts:
+                raise ReservationConflictError(conflicts)
+
+            series.save()
+            # the weeks that were cut off don't need their exceptions anymore
+            series.exceptions.exclude(day__range=[series.start_day, series.end_day]).delete()
+        return series
+
+    return with_optimistic_retry(save)
+
+
+def end_reservation_series(series, today):
+    """
+    Cancel the weeks of a series from today on. The weeks that were already played are kept, so the reports
+    of the past days don't change, and a series that didn't start yet is deleted.
+
+    :param series: A ReservationSeries object
+    :param today: The current date
+    """
+    past_days = [day for day in series.get_days() if day < today]
+    if not past_days:
+        series.delete()
+    elif past_days[-1] != series.end_day:
+        series.end_day = past_days[-1]
+        save_reservation_series(series)
+
+
+def cancel_series_week(series, day):
+    """
+    Cancel one week of a series, its time slot becomes free in that day
+    """
+    if series.occurs_on(day):
+        series.exceptions.get_or_create(day=day)
+
+
+def restore_series_week(series, day):
+    """
+    Give back a cancelled week of a series, if its time slot wasn't reserved since
+
+    :raises ReservationConflictError: if the time slot was reserved in that day
+    """
+
+    def restore():
+        with transaction.atomic():
+            lock_time_slot(series.time_slot)
+            if get_conflicting_dates(series.time_slot, [day], exclude=series):
+                raise ReservationConflictError([day])
+            series.exceptions.filter(day=day).delete()
+
+    with_optimistic_retry(restore)
 
 
 def get_next_seven_days(initial_date):
@@ -210,12 +469,71 @@ def get_next_seven_days(initial_date):
 
 
 def get_facilities_and_slots(day):
-    facilities = Facility.objects.all()
-    facilities_and_slots = [{'facility_name': facility.name,
-                             'free_slots': TimeSlot.objects.filter(facility=facility).exclude(reservation__day=day)
-                             .order_by('start_time')}
-                            for facility in facilities]
-    return facilities_and_slots
+    """
+    Get the free slots of every facility in a given day, using a fixed number of queries
+    """
+    return get_availability_grid([day]).facilities_and_slots(day)
+
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def get_minutes(time):
+    return time.hour * 60 + time.minute
+
+
+def get_daily_time_range(item):
+    """
+    Get the (start, end) minutes of an object with start_time and end_time, like a TimeSlot
+    """
+    return get_minutes(item.start_time), get_minutes(item.end_time)
+
+
+def find_time_conflicts(items, get_range=get_daily_time_range, period=MINUTES_IN_DAY):
+    """
+    Find every pair of overlapping time ranges in one sort-and-sweep pass, O(n log n + number of conflicts).
+    A range that ends before (or when) it starts crosses midnight, so it continues in the next day, and a range
+    that goes past the end of the period wraps around to its beginning (the slots of a day repeat every day).
+    Ranges that only touch, like 16:00-17:00 and 17:00-18:00, don't conflict.
+
+    Ex: to find the conflicting time slots of a facility, call:
+        find_time_conflicts(facility.timeslot_set.all())
+
+    :param items: A list of objects, like TimeSlots
+    :param get_range: A function that returns the (start, end) minutes of an item within the period
+    :param period: The length of the repeating period in minutes, a day by default
+    :return: A list of (item1, item2) tuples, item1 coming before item2 in items
+    """
+    items = list(items)
+
+    intervals = []
+    for index, item in enumerate(items):
+        start, end = get_range(item)
+        if end <= start:
+            end += MINUTES_IN_DAY
+
+        if end > period:
+            # split the part that wraps around to the beginning of the period
+            intervals.append((start, period, index))
+            intervals.append((0, end - period, index))
+        else:
+            intervals.append((start, end, index))
+
+    intervals.sort()
+
+    conflicts = set()
+    active = []  # a heap of (end, index) of the intervals that started before the current one
+    for start, end, index in intervals:
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+
+        for _, other in active:
+            if other != index:
+                conflicts.add((min(index, other), max(index, other)))
+
+        heapq.heappush(active, (end, index))
+
+    return [(items[first], items[second]) for first, second in sorted(conflicts)]
 
 
 def check_time_conflict(time_slot1, time_slot2):
@@ -225,12 +543,4 @@ def check_time_conflict(time_slot1, time_slot2):
     :param time_slot2: A TimeSlot object
     :return: True if the two time slots conflict with each other, False otherwise
     """
-    if time_slot1.start_time < time_slot2.start_time < time_slot1.end_time:
-        return True
-    if time_slot1.start_time < time_slot2.end_time < time_slot1.end_time:
-        return True
-    if time_slot2.start_time < time_slot1.start_time < time_slot2.end_time:
-        return True
-    if time_slot2.start_time < time_slot1.end_time < time_slot2.end_time:
-        return True
-    return False
+    return bool(find_time_conflicts([time_slot1, time_slot2]))
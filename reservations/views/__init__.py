@@ -1,5 +1,7 @@
 from .category_facility_views import *
 from .reservations_views import *
+from .series_views import *
 from .report_views import *
 from .invoice_views import *
+from .api_views import get_facility_availability_view
 
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytz
+from asgiref.sync import sync_to_async
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.http import JsonResponse, Http404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+
+from middleapp.cache import aget_cache_version
+from reservations.models import Facility
+from reservations.queries import get_availability_grid
+from reservations.signals import get_availability_version_name, AVAILABILITY_VERSION_TIMEOUT
+
+# The longest range of days one availability request can ask for
+MAX_AVAILABILITY_DAYS = 31
+
+
+def get_availability_days(params):
+    """
+    Get the days of an availability request from its start and end parameters (YYYY-MM-dd),
+    from today to 6 days later by default
+    """
+    today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+    try:
+        start = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else today
+        end = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else start + timedelta(days=6)
+    except ValueError:
+        raise BadRequest('The start and end dates must be in the YYYY-MM-dd format')
+
+    if end < start or (end - start).days >= MAX_AVAILABILITY_DAYS:
+        raise BadRequest(f'The end date must be after the start date, and at most {MAX_AVAILABILITY_DAYS} days later')
+    return [start + timedelta(days=index) for index in range((end - start).days + 1)]
+
+
+def get_facility_availability(facility_id, days):
+    """
+    The availability of a facility's time slots in the given days, in the shape of the availability endpoint:
+    {'facility': {'id': 1, 'name': 'Facility 1'},
+     'days': [{'day': '2023-08-21', 'slots': [{'id': 3, 'start_time': '16:00', 'end_time': '17:00', 'free': True},
+                                              etc...]},
+              etc...]}
+    """
+    facility = Facility.objects.filter(pk=facility_id).first()
+    if facility is None:
+        raise Http404('Facility does not exist')
+
+    grid = get_availability_grid(days, [facility])
+    return {
+        'facility': {'id': facility.id, 'name': facility.name},
+        'days': [{'day': day.isoformat(),
+                  'slots': [{'id': slot.id,
+                             'start_time': slot.start_time.strftime('%H:%M'),
+                             'end_time': slot.end_time.strftime('%H:%M'),
+                             'free': grid.is_free(slot, day)}
+                            for slot in grid.slots(facility.id)]}
+                 for day in days],
+    }
+
+
+def can_view_availability(user):
+    return user.is_authenticated and user.has_perm('reservations.add_reservation')
+
+
+async def get_facility_availability_view(request, pk):
+    """
+    The free and reserved slots of a facility in a range of days as JSON,
+    ex: /api/facilities/1/availability?start=2023-08-21&end=2023-08-27
+
+    The response has an ETag made of the facility's availability version, which is bumped whenever its
+    reservations or its slots change (see reservations/signals.py). A client that polls with If-None-Match
+    gets a 304 Not Modified without the availability being read from the database, until it changes
+    or the version expires (see AVAILABILITY_VERSION_TIMEOUT).
+    """
+    if not await sync_to_async(can_view_availability)(request.user):
+        raise PermissionDenied
+
+    days = get_availability_days(request.GET)
+    version = await aget_cache_version(get_availability_version_name(pk), AVAILABILITY_VERSION_TIMEOUT)
+    etag = f'"{pk}-{version}-{days[0]:%Y%m%d}-{days[-1]:%Y%m%d}"'
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified.headers['ETag'] = etag
+        return not_modified
+
+    # the version was read first, so a change made while reading the availability gives it a new ETag
+    availability = await sync_to_async(get_facility_availability)(pk, days)
+    response = JsonResponse(availability)
+    response.headers['ETag'] = etag
+    # the clients have to check with the server before using their copy, which costs a 304 while it didn't change
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -4,19 +4,21 @@ from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, CreateView, DetailView, UpdateView, FormView
 from django.views.generic.detail import SingleObjectMixin
 
+from middleapp.mixins import RelatedObjectsMixin
 from reservations.forms import get_FTS_inlineformset_factory, FacilityForm, CategoryForm
 from reservations.models import Facility, FacilityCategory, TimeSlot
 
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 
-from reservations.utilities import check_time_conflict
+from reservations.utilities import find_time_conflicts
 
 
-class FacilitiesListView(LoginRequiredMixin,UserPassesTestMixin, ListView):
+class FacilitiesListView(LoginRequiredMixin,UserPassesTestMixin, RelatedObjectsMixin, ListView):
     model = Facility
     template_name = 'CategoryFacilityTemplates/facilities.html'
     queryset = Facility.objects.filter()
     context_object_name = 'facilities'
+    select_related = ('category',)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -115,15 +117,16 @@ class TimeSlotEditView(LoginRequiredMixin, PermissionRequiredMixin, SingleObject
 
     def form_valid(self, form):
         changedSlots = form.save(commit=False)
-        unchangedSlots = TimeSlot.objects.filter(facility=self.object).exclude(pk__in=[obj.pk for obj in changedSlots])
+        deletedSlots = [obj.pk for obj in form.deleted_objects]
+        unchangedSlots = (TimeSlot.objects.filter(facility=self.object)
+                          .exclude(pk__in=[obj.pk for obj in changedSlots] + deletedSlots))
         allSlots = list(changedSlots) + list(unchangedSlots)
 
-        for changed in changedSlots:
-            other_slots = [slot for slot in allSlots if slot != changed]
-            for other in other_slots:
-                if check_time_conflict(changed, other):
-                    messages.error(self.request, 'هناك تعارض بين الفترات الزمنية')
-                    return self.form_invalid(form)
+        # only the conflicts that involve a changed slot block the edit
+        for slot1, slot2 in find_time_conflicts(allSlots):
+            if slot1 in changedSlots or slot2 in changedSlots:
+                messages.error(self.request, 'هناك تعارض بين الفترات الزمنية')
+                return self.form_invalid(form)
 
         form.save()
         return HttpResponseRedirect(self.get_success_url())
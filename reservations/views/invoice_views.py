@@ -1,17 +1,71 @@
+from datetime import datetime
+
 import pytz
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.core.exceptions import ObjectDoesNotExist
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.views import View
-from django.http import HttpResponse, Http404
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from reservations.models import Reservation, ReservationSeries
+
+from middleapp.branding import get_branding, get_logo_url
+from middleapp.pdf import get_pdf_cache_name, get_organization_data, serve_cached_pdf
+
+
+def get_invoice_number(reservation):
+    """
+    The number of a reservation's invoice, ex: '0052', the weeks of a series have the number of their series
+    and of their week, ex: 'S0007-03'
+    """
+    series = getattr(reservation, 'series', None)
+    if series is not None:
+        return f'S{series.pk:04d}-{series.get_days().index(reservation.day) + 1:02d}'
+    return f'{reservation.id:04d}'
+
+
+def get_invoice_html(reservation, organization, logo_url=''):
+    """
+    Render the HTML of a reservation's invoice, to be converted to a PDF
+
+    :param reservation: A Reservation object, or the week of a series (see ReservationSeries.occurrence)
+    :param organization: The Organization object, or None
+    :param logo_url: An absolute http url of the organization's logo
+    """
+    price_before_vat = (reservation.price / 1.15).__round__(2)
+    tax = (reservation.price - price_before_vat).__round__(2)
+    now = timezone.now().astimezone(pytz.timezone('Asia/Riyadh'))
 
-from reservations.models import Reservation
+    context = {
+        'reservation': reservation,
+        'organization': organization,
+        'invoice_number': get_invoice_number(reservation),
+        'tax': tax,
+        'price_before_tax': price_before_vat,
+        'now': now.strftime("%H:%M %Y-%m-%d"),
+        'logo_url': logo_url,
+    }
+    return render_to_string('invoiceTemplates/invoice.html', context)
 
-from middleapp.models import Organization
 
+def serve_invoice(request, reservation):
+    branding = get_branding()
+    organization = branding.organization
+    logo_url = get_logo_url(request)
+    invoice_number = get_invoice_number(reservation)
 
-import pdfkit
+    # the invoice shows the time it was first issued, so its PDF only changes with its data
+    cache_name = get_pdf_cache_name('invoiceTemplates/invoice.html', {
+        'id': invoice_number,
+        'price': reservation.price,
+        'facility': reservation.facility.name if reservation.facility else None,
+        'organization': get_organization_data(organization),
+    })
+    return serve_cached_pdf(request, cache_name, lambda: get_invoice_html(reservation, organization, logo_url),
+                            f'فاتورة{reservation.facility}_{invoice_number}.pdf',
+                            options={"enable-local-file-access": ""})
 
 
 class GenerateInvoiceView(LoginRequiredMixin, PermissionRequiredMixin, View):
@@ -19,29 +73,22 @@ class GenerateInvoiceView(LoginRequiredMixin, PermissionRequiredMixin, View):
 
     def get(self, request, pk):
         try:
-            reservation = Reservation.objects.get(id=pk)
-            organization = Organization.objects.first()
+            reservation = Reservation.objects.select_related('facility').get(id=pk)
         except ObjectDoesNotExist:
             raise Http404
-        price_before_vat = (reservation.price / 1.15).__round__(2)
-        tax = (reservation.price - price_before_vat).__round__(2)
-        now = timezone.now().astimezone(pytz.timezone('Asia/Riyadh'))
-
-        logo_url = request.build_absolute_uri(organization.logo.url) if (organization and organization.logo) else ''
-        if logo_url.startswith('https://'):
-            logo_url = logo_url.replace('https://', 'http://', 1)
-        context = {
-            'reservation': reservation,
-            'organization': organization,
-            'invoice_number': f'{reservation.id:04d}',
-            'tax': tax,
-            'price_before_tax': price_before_vat,
-            'now': now.strftime("%H:%M %Y-%m-%d"),
-            'logo_url': logo_url,
-        }
-        html = render_to_string('invoiceTemplates/invoice.html', context)
-        pdf = pdfkit.from_string(html, False, options={"enable-local-file-access": ""})
-
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="فاتورة{reservation.facility}_{reservation.id}.pdf"'
-        return response
+        return serve_invoice(request, reservation)
+
+
+class GenerateSeriesInvoiceView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    # the invoice of one week of a series, ex: /series/7/invoice/2023-08-21
+    permission_required = 'reservations.add_reservation'
+
+    def get(self, request, pk, day):
+        series = get_object_or_404(ReservationSeries.objects.select_related('facility'), pk=pk)
+        try:
+            day = datetime.strptime(day, '%Y-%m-%d').date()
+        except ValueError:
+            raise Http404
+        if not series.occurs_on(day) or series.exceptions.filter(day=day).exists():
+            raise Http404
+        return serve_invoice(request, series.occurrence(day))
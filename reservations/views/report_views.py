@@ -1,21 +1,27 @@
-from django.db.models import Sum
+from django.db.models import Sum, F
 from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.views import View
-from django.views.generic import FormView
-from django.http import HttpResponse
+from django.views.generic import FormView, TemplateView
 from django.urls import reverse
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib import messages
-
-from reservations.forms import ReportForm
-from reservations.models import Reservation
-from reservations.queries import get_report_info
+from django.http import StreamingHttpResponse
+
+from reservations.forms import ReportForm, REPORT_MIN_YEAR, REPORT_MAX_YEAR
+from reservations.models import Reservation, ReservationSeries
+from reservations.queries import get_cached_report_info, get_cached_occupancy_heatmap
+from reservations.exports import stream_reservations_csv
+from reservations.series import get_series_in_days, expand_series
+from reservations.utilities import get_reservation_queryset_from_params, get_series_queryset_from_params, \
+    get_day_filter_from_params
+from reservations.pagination import iter_series_weeks
+from middleapp.pdf import render_pdf_in_background, render_chunked_pdf_in_background
+from middleapp.routers import use_replica, get_replica_database
 
 from urllib.parse import urlencode
-from datetime import datetime
-import pdfkit
+from datetime import datetime, timedelta
 import calendar
 import pytz
 
@@ -87,6 +93,14 @@ class ChooseReportView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
 
             return redirect(redirect_url)
 
+        elif report_type == 'record_csv':
+            # export the records as a spreadsheet, with the filters of the reservations search
+            redirect_url = reverse('reservations:reservations-export')
+            query_string = urlencode({'searchByDay': 'range', 'dayFrom': start_date, 'dayTo': end_date})
+            redirect_url = f'{redirect_url}?{query_string}'
+
+            return redirect(redirect_url)
+
         else:  # records
             # redirect to records report with get parameters
             redirect_url = reverse('reservations:records-report')
@@ -117,6 +131,7 @@ class SummaryReportView(LoginRequiredMixin, PermissionRequiredMixin, View):
         'margin-left': '0.5in',
     }
 
+    @use_replica()
     def get(self, request):
         if self.request.method == 'GET':
 
@@ -135,7 +150,7 @@ class SummaryReportView(LoginRequiredMixin, PermissionRequiredMixin, View):
                 messages.error(self.request, "يجب اختيار تاريخ التقرير بشكل صحيح")
                 return redirect('reservations:choose-report')
 
-            reports = get_report_info(start_date, end_date)
+            reports = get_cached_report_info(start_date, end_date)
 
             time = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).strftime("%Y-%m-%d %H:%M")
 
@@ -147,11 +162,7 @@ class SummaryReportView(LoginRequiredMixin, PermissionRequiredMixin, View):
             }
             html = render_to_string('reportTemplates/summary_report.html', context)
 
-            pdf = pdfkit.from_string(html, False, options=self.options)
-
-            response = HttpResponse(pdf, content_type='application/pdf')
-            response['Content-Disposition'] = f'inline; filename="Summary_Report_{time}.pdf"'
-            return response
+            return render_pdf_in_background(self.request, html, f'Summary_Report_{time}.pdf', options=self.options)
 
 
 class ReservationsRecordsView(LoginRequiredMixin, PermissionRequiredMixin, View):
@@ -176,32 +187,129 @@ class ReservationsRecordsView(LoginRequiredMixin, PermissionRequiredMixin, View)
 
             # validate the date types
             try:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').astimezone(pytz.timezone('Asia/Riyadh'))
-                end_date = datetime.strptime(end_date, '%Y-%m-%d').astimezone(pytz.timezone('Asia/Riyadh'))
+                datetime.strptime(start_date, '%Y-%m-%d')
+                datetime.strptime(end_date, '%Y-%m-%d')
             except (ValueError, TypeError):
                 messages.error(self.request, "يجب اختيار تاريخ التقرير بشكل صحيح")
                 return redirect('reservations:choose-report')
 
-            reservations = (Reservation.objects
-                            .filter(day__range=[start_date, end_date])
-                            .order_by('day', 'time_slot__start_time'))
+            time = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).strftime("%Y-%m-%d %H:%M")
 
-            total_income = reservations.aggregate(total=Sum('price'))['total']
+            # a record of a year is too big for one wkhtmltopdf process, so it's rendered one month at a time.
+            # the database is chosen here, the worker doesn't know if the user was pinned to the primary database
+            return render_chunked_pdf_in_background(
+                self.request, 'reservations.views.report_views.get_reservations_record_chunks',
+                {'start_date': start_date, 'end_date': end_date, 'time': time, 'database': get_replica_database()},
+                f'Reservations_Record_{time}.pdf', options=self.options)
+
+
+def get_record_order(reservation):
+    return reservation.day, reservation.time_slot.start_time if reservation.time_slot else datetime.min.time()
+
+
+def get_reservations_record_chunks(start_date, end_date, time, database=None):
+    """
+    Generate the HTML of the reservations record in parts of one month each, to be rendered with
+    middleapp.pdf.render_chunked_pdf. Only the reservations of one month are loaded at a time.
+
+    :param start_date: The first day of the record (YYYY-MM-dd)
+    :param end_date: The last day of the record (YYYY-MM-dd)
+    :param time: The time the record was asked for, shown in its header
+    :param database: The database alias the record is read from, chosen by the request that asked for it
+                     (see get_replica_database), the replica when it's missing
+    """
+    start_date = datetime.strptime(start_date, '%Y-%m-%d').astimezone(pytz.timezone('Asia/Riyadh'))
+    end_date = datetime.strptime(end_date, '%Y-%m-%d').astimezone(pytz.timezone('Asia/Riyadh'))
+
+    database = database or get_replica_database()
+    reservations = Reservation.objects.using(database).filter(day__range=[start_date, end_date])
+    series = ReservationSeries.objects.using(database).select_related('user', 'facility', 'time_slot')
+    total_income = reservations.aggregate(total=Sum('price', default=0))['total']
+
+    months = []
+    month_start = start_date.date()
+    while month_start <= end_date.date():
+        _, last_day = calendar.monthrange(month_start.year, month_start.month)
+        month_end = min(month_start.replace(day=last_day), end_date.date())
+        months.append((month_start, month_end))
+        month_start = month_end + timedelta(days=1)
+
+    for index, (month_start, month_end) in enumerate(months):
+        # the weeks of the series are expanded one month at a time too, and added to the total as they're read
+        days = [month_start + timedelta(days=day) for day in range((month_end - month_start).days + 1)]
+        series_reservations = expand_series(get_series_in_days(days, series), days)
+        total_income += sum(reservation.price for reservation in series_reservations)
+
+        month_reservations = list(reservations.filter(day__range=[month_start, month_end])
+                                  .select_related('user', 'facility', 'time_slot'))
+        context = {
+            'reservations': sorted(month_reservations + series_reservations, key=get_record_order),
+            'time': time,
+            'start_date': start_date,
+            'end_date': end_date,
+            'total_income': total_income,
+            'show_header': index == 0,
+            'show_total': index == len(months) - 1,
+        }
+        yield render_to_string('reportTemplates/reservations_record.html', context)
+
+
+class ReservationsExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    # exports the reservations that match the parameters of the reservations search as a CSV file
+    permission_required = 'reservations.create_report'
 
-            time = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).strftime("%Y-%m-%d %H:%M")
+    def get(self, request):
+        # the rows are read from the replica while the response streams, after the view returned
+        database = get_replica_database()
+        reservations = (get_reservation_queryset_from_params(Reservation.objects.using(database), self.request.GET)
+                        .order_by(F('day').desc(), F('time_slot__start_time').desc(nulls_last=True)))
+        # the weeks of the series that match the search are merged into the rows
+        series = get_series_queryset_from_params(ReservationSeries.objects.using(database), self.request.GET)
+        series_weeks = iter_series_weeks(series, get_day_filter_from_params(self.request.GET))
+        time = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).strftime("%Y-%m-%d_%H-%M")
+
+        response = StreamingHttpResponse(stream_reservations_csv(reservations, series_weeks),
+                                         content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="Reservations_{time}.csv"'
+        return response
+
+
+class OccupancyHeatmapView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
+    # shows the occupied slots of a whole month per facility and per category, ex: /occupancy?month=2023-08
+    permission_required = 'reservations.create_report'
+    template_name = 'reportTemplates/occupancy_heatmap.html'
 
-            context = {
-                'reservations': reservations,
-                'time': time,
-                'start_date': start_date,
-                'end_date': end_date,
-                'total_income': total_income,
-            }
+    @use_replica()
+    def get(self, request, *args, **kwargs):
+        month = self.request.GET.get('month')
+        if month:
+            try:
+                self.month = datetime.strptime(month, '%Y-%m').date()
+            except (ValueError, TypeError):
+                messages.error(self.request, 'قيمة الشهر أو السنة غير صحيحة')
+                return redirect('reservations:occupancy-heatmap')
+            if not REPORT_MIN_YEAR <= self.month.year <= REPORT_MAX_YEAR:
+                messages.error(self.request, f'السنة يجب أن تكون بين {REPORT_MIN_YEAR} و {REPORT_MAX_YEAR}')
+                return redirect('reservations:occupancy-heatmap')
+        else:
+            self.month = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date().replace(day=1)
+
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
 
-            html = render_to_string('reportTemplates/reservations_record.html', context)
+        # the months before and after the years of the reports aren't linked
+        previous_month = (self.month - timedelta(days=1)).replace(day=1)
+        next_month = (self.month + timedelta(days=32)).replace(day=1)
 
-            pdf = pdfkit.from_string(html, False, options=self.options)
+        heatmap = get_cached_occupancy_heatmap(self.month.year, self.month.month)
 
-            response = HttpResponse(pdf, content_type='application/pdf')
-            response['Content-Disposition'] = f'inline; filename="Reservations_Record_{time}.pdf"'
-            return response
+        context.update({'heatmap': heatmap,
+                        'heatmap_sections': [('الملاعب', heatmap['facilities']), ('التصنيفات', heatmap['categories'])],
+                        'month': self.month,
+                        'previous_month': previous_month.strftime('%Y-%m')
+                        if previous_month.year >= REPORT_MIN_YEAR else None,
+                        'next_month': next_month.strftime('%Y-%m') if next_month.year <= REPORT_MAX_YEAR else None,
+                        'occupancy_active': True})
+        return context
@@ -1,4 +1,5 @@
 import pytz
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.http import Http404
 from django.shortcuts import redirect
@@ -7,18 +8,21 @@ from django.utils import timezone
 from django.views.generic import DeleteView, ListView, TemplateView
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import FormMixin
-from django.db.models import Q
 from formtools.wizard.views import SessionWizardView
 
+from middleapp.mixins import RelatedObjectsMixin
+from reservations.events import get_reservation_events_url
 from reservations.forms import ReservationSearchForm, ReservationForm1, ReservationForm2, UpdateReservationForm1, \
     UpdateReservationForm2, WeeklyReservationForm1, WeeklyReservationForm2
-from reservations.models import Reservation, TimeSlot
-from reservations.queries import get_all_slots, get_weekly_free_slots, get_free_slots
-from reservations.utilities import createMultipleReservations, get_reservation_queryset_from_params, \
-    validate_reservation_search_params, get_next_seven_days, get_facilities_and_slots
+from reservations.models import Reservation, ReservationSeries, TimeSlot
+from reservations.pagination import get_keyset_page, get_cached_count
+from reservations.queries import get_all_slots, get_free_slots, get_availability_grid, get_today_board
+from reservations.queries.board_queries import get_business_day
+from reservations.utilities import create_reservation_series, get_reservation_queryset_from_params, \
+    validate_reservation_search_params, get_next_seven_days, get_facilities_and_slots, get_dates_of_weekdays, \
+    ReservationConflictError, save_reservation, get_series_queryset_from_params, get_day_filter_from_params
 
 from datetime import datetime, timedelta
-from urllib.parse import urlencode
 
 
 class FormListView(FormMixin, ListView):
@@ -41,25 +45,26 @@ class FormListView(FormMixin, ListView):
 class ReservationsListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     permission_required = 'reservations.add_reservation'
     model = Reservation
-    today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
     template_name = 'reservationsTemplates/reservations.html'
 
-    today_queryset = Reservation.objects.filter(day=today).filter(
-        Q(time_slot__end_time__gte=timezone.now().astimezone(pytz.timezone('Asia/Riyadh'))) | Q(time_slot__start_time__gte=timezone.now().astimezone(pytz.timezone('Asia/Riyadh'))))
-    tomorrow = today + timedelta(days=1)
-    tomorrow_queryset = Reservation.objects.filter(day=tomorrow, time_slot__start_time__lte='04:00:00')
-    queryset = (today_queryset | tomorrow_queryset).order_by('day', 'time_slot__start_time')
-
     context_object_name = 'reservations'
     paginate_by = 10
 
+    def get_queryset(self):
+        # computed on every request, so the board follows the current day
+        return get_today_board()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
-        next_days = get_next_seven_days(today)
+        now = timezone.now().astimezone(pytz.timezone('Asia/Riyadh'))
+        next_days = get_next_seven_days(now.date())
+
+        # the board shows the night of the business day, which ends in the next day
+        business_day = get_business_day(now)
+        events_url = get_reservation_events_url(days=[business_day, business_day + timedelta(days=1)])
 
-        context.update({'next_days': next_days, 'home_active': True})
+        context.update({'next_days': next_days, 'events_url': events_url, 'home_active': True})
         return context
 
 
@@ -84,16 +89,18 @@ class FreeSlotsView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
         facilities_and_slots = get_facilities_and_slots(chosenDay)
 
         context.update({'next_days': next_days, 'facilities_slots': facilities_and_slots, 'chosenDay': chosenDay,
-                        'home_active': True})
+                        'events_url': get_reservation_events_url(days=[chosenDay]), 'home_active': True})
         return context
 
 
-class ReservationListFormView(LoginRequiredMixin, PermissionRequiredMixin, FormListView):
+class ReservationListFormView(LoginRequiredMixin, PermissionRequiredMixin, RelatedObjectsMixin, FormListView):
     permission_required = 'reservations.add_reservation'
     form_class = ReservationSearchForm
     model = Reservation
     template_name = 'reservationsTemplates/reservationsListForm.html'
-    paginate_by = 10
+    select_related = ('user', 'facility', 'time_slot')
+    # The list is paginated by seeking from a cursor (see reservations/pagination.py), not with OFFSET pages
+    per_page = 10
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -114,7 +121,17 @@ class ReservationListFormView(LoginRequiredMixin, PermissionRequiredMixin, FormL
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context.update({'res_list_active': True})
+        # the weeks of the series that match the search are listed with the reservations
+        series = list(get_series_queryset_from_params(ReservationSeries.objects.all(), self.request.GET))
+        include_day = get_day_filter_from_params(self.request.GET)
+
+        page = get_keyset_page(self.object_list, after=self.request.GET.get('after'),
+                               before=self.request.GET.get('before'), per_page=self.per_page,
+                               series=series, include_day=include_day)
+        results_count = get_cached_count(self.object_list, validate_reservation_search_params(self.request.GET),
+                                         series=series, include_day=include_day)
+
+        context.update({'page': page, 'results_count': results_count, 'res_list_active': True})
         return context
 
 
@@ -144,10 +161,9 @@ class ReservationWizardView(LoginRequiredMixin, PermissionRequiredMixin, Session
         if self.steps.current == '1':
             first_form_data = self.get_cleaned_data_for_step('0')
             facility = first_form_data.get('facility')
-            freeSlots = get_free_slots(facility, first_form_data.get('day'))
-            freeSlotsIDs = [slot.id for slot in freeSlots]
-            allSlots = get_all_slots(facility)
-            context.update({'facility': facility, 'allSlots': allSlots, 'freeSlotsIDs': freeSlotsIDs})
+            grid = get_availability_grid([first_form_data.get('day')], facilities=[facility])
+            context.update({'facility': facility, 'allSlots': grid.slots(facility.id),
+                            'freeSlotsIDs': grid.free_slot_ids(facility.id)})
         context.update({'isSingleCreateView': True, 'create_res_active': True})
         return context
 
@@ -165,7 +181,11 @@ class ReservationWizardView(LoginRequiredMixin, PermissionRequiredMixin, Session
         else:
             reservation.price = reservation.facility.default_price
 
-        reservation.save()
+        try:
+            save_reservation(reservation)
+        except ReservationConflictError:
+            messages.error(self.request, 'تم حجز هذه الفترة للتو، الرجاء اختيار فترة أخرى')
+            return redirect('reservations:create-reservation')
 
         return redirect('reservations:home')
 
@@ -222,7 +242,11 @@ class UpdateReservationWizardView(LoginRequiredMixin, PermissionRequiredMixin, S
         if self.request.user.has_perm('reservations.change_price'):
             self.object.price = second_form_data.get('price')
 
-        self.object.save()
+        try:
+            save_reservation(self.object)
+        except ReservationConflictError:
+            messages.error(self.request, 'تم حجز هذه الفترة للتو، الرجاء اختيار فترة أخرى')
+            return redirect('reservations:update-reservation', pk=self.object.pk)
 
         return redirect('reservations:reservations-list')
 
@@ -253,10 +277,10 @@ class CreateWeeklyReservationWizardView(LoginRequiredMixin, PermissionRequiredMi
         if self.steps.current == '1':
             first_form_data = self.get_cleaned_data_for_step('0')
             facility = first_form_data.get('facility')
-            freeSlots = get_weekly_free_slots(facility, first_form_data.get('day'), first_form_data.get('weeksNumber'))
-            freeSlotsIDs = [slot.id for slot in freeSlots]
-            allSlots = get_all_slots(facility)
-            context.update({'facility': facility, 'allSlots': allSlots, 'freeSlotsIDs': freeSlotsIDs})
+            dates = get_dates_of_weekdays(first_form_data.get('day'), first_form_data.get('weeksNumber'))
+            grid = get_availability_grid(dates, facilities=[facility])
+            context.update({'facility': facility, 'allSlots': grid.slots(facility.id),
+                            'freeSlotsIDs': grid.free_slot_ids(facility.id)})
         context.update({'create_res_active': True})
         return context
 
@@ -269,21 +293,20 @@ class CreateWeeklyReservationWizardView(LoginRequiredMixin, PermissionRequiredMi
         else:
             price = first_form_data.get('facility').default_price
 
-        reservations = createMultipleReservations(first_form_data.get('facility'),
-                                                  first_form_data.get('day'),
-                                                  second_form_data.get('user'),
-                                                  second_form_data.get('time_slot'),
-                                                  price,
-                                                  first_form_data.get('weeksNumber'))
-
-        redirect_url = reverse_lazy('reservations:reservations-list')
-        query_string = urlencode(
-            {'user': reservations[0].user.id, 'searchByDay': 'after', 'day': first_form_data.get('day'),
-             'facility': reservations[0].facility.id, 'price': second_form_data.get('price')}
-        )
-        redirect_url = f'{redirect_url}?{query_string}#pagination'
-
-        return redirect(redirect_url)
+        # the weeks are stored once as a series, see reservations/series.py
+        try:
+            series = create_reservation_series(first_form_data.get('facility'),
+                                               first_form_data.get('day'),
+                                               second_form_data.get('user'),
+                                               second_form_data.get('time_slot'),
+                                               price,
+                                               first_form_data.get('weeksNumber'))
+        except ReservationConflictError as error:
+            dates = '، '.join(date.strftime('%Y-%m-%d') for date in error.dates)
+            messages.error(self.request, f'الفترة محجوزة مسبقاً في التواريخ التالية: {dates}')
+            return redirect('reservations:create-weekly-reservation')
+
+        return redirect(series.get_absolute_url())
 
 
 class ReservationDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import pytz
+from django.contrib import messages
+from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.shortcuts import redirect, get_object_or_404
+from django.urls import reverse_lazy
+from django.utils import timezone
+from django.views import View
+from django.views.generic import ListView, DetailView, UpdateView, DeleteView
+
+from reservations.forms import ReservationSeriesForm
+from reservations.models import ReservationSeries
+from reservations.utilities import ReservationConflictError, save_reservation_series, cancel_series_week, \
+    restore_series_week, end_reservation_series
+
+
+def get_conflict_message(error):
+    dates = '، '.join(date.strftime('%Y-%m-%d') for date in error.dates)
+    return f'الفترة محجوزة مسبقاً في التواريخ التالية: {dates}'
+
+
+class ReservationSeriesListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+    # the weekly reservations that didn't end yet
+    permission_required = 'reservations.add_reservation'
+    model = ReservationSeries
+    template_name = 'reservationsTemplates/series_list.html'
+    context_object_name = 'series_list'
+    paginate_by = 10
+
+    def get_queryset(self):
+        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+        return (ReservationSeries.objects
+                .filter(end_day__gte=today)
+                .select_related('user', 'facility', 'time_slot')
+                .order_by('start_day', 'id'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update({'series_active': True})
+        return context
+
+
+class ReservationSeriesDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
+    permission_required = 'reservations.add_reservation'
+    model = ReservationSeries
+    template_name = 'reservationsTemplates/series_detail.html'
+    context_object_name = 'series'
+
+    def get_queryset(self):
+        return ReservationSeries.objects.select_related('user', 'facility', 'time_slot')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+        cancelled = set(self.object.exceptions.values_list('day', flat=True))
+        weeks = [{'day': day, 'cancelled': day in cancelled, 'past': day < today} for day in self.object.get_days()]
+
+        context.update({'weeks': weeks, 'series_active': True})
+        return context
+
+
+class ReservationSeriesUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
+    permission_required = 'reservations.add_reservation'
+    model = ReservationSeries
+    form_class = ReservationSeriesForm
+    template_name = 'reservationsTemplates/update_series.html'
+    context_object_name = 'series'
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        if self.request.user.has_perm('reservations.change_price'):
+            kwargs.update({'can_change_price': True})
+        return kwargs
+
+    def form_valid(self, form):
+        series = form.save(commit=False)
+        series.end_day = series.start_day + timedelta(weeks=form.cleaned_data.get('weeksNumber') - 1)
+
+        try:
+            save_reservation_series(series)
+        except ReservationConflictError as error:
+            messages.error(self.request, get_conflict_message(error))
+            return redirect('reservations:update-series', pk=series.pk)
+
+        return redirect(series.get_absolute_url())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update({'series_active': True})
+        return context
+
+
+class ReservationSeriesDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
+    # cancels the weeks of the series from today on, the past weeks are kept
+    permission_required = 'reservations.add_reservation'
+    model = ReservationSeries
+    template_name = 'delete_object.html'
+    context_object_name = 'object'
+    success_url = reverse_lazy('reservations:series-list')
+
+    def form_valid(self, form):
+        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+        end_reservation_series(self.object, today)
+        return redirect(self.get_success_url())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update({'series_active': True})
+        return context
+
+
+class ReservationSeriesWeekView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    # cancels a single week of a series, or gives it back
+    permission_required = 'reservations.add_reservation'
+
+    def post(self, request, pk):
+        series = get_object_or_404(ReservationSeries, pk=pk)
+
+        try:
+            day = datetime.strptime(self.request.POST.get('day'), '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            messages.error(self.request, 'التاريخ غير صحيح')
+            return redirect(series.get_absolute_url())
+
+        if not series.occurs_on(day):
+            messages.error(self.request, 'التاريخ ليس من أسابيع الحجز')
+            return redirect(series.get_absolute_url())
+
+        # the weeks that were already played can't be changed
+        today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+        if day < today:
+            messages.error(self.request, 'لا يمكن تعديل أسبوع مضى')
+            return redirect(series.get_absolute_url())
+
+        if self.request.POST.get('action') == 'restore':
+            try:
+                restore_series_week(series, day)
+            except ReservationConflictError as error:
+                messages.error(self.request, get_conflict_message(error))
+        else:
+            cancel_series_week(series, day)
+
+        return redirect(series.get_absolute_url())
@@ -20,7 +20,9 @@ class UserWidget(s2forms.ModelSelect2Widget):
 
 class SubscriptionCreateForm(forms.ModelForm):
     user = forms.ModelChoiceField(required=True, queryset=get_all_customers(), widget=UserWidget, label='العميل')
-    division = forms.ModelChoiceField(required=True, queryset=Division.objects.filter(suspended=False), label='الفئة')
+    division = forms.ModelChoiceField(required=True,
+                                      queryset=Division.objects.filter(suspended=False).select_related('category'),
+                                      label='الفئة')
     start_date = forms.DateField(required=True, widget=forms.DateInput(attrs={'type': 'date'}), label='تاريخ البدء')
     months_num = forms.IntegerField(required=True, initial=1, label='عدد الشهور', min_value=1)
     price = forms.DecimalField(required=True, decimal_places=2, max_digits=5, label='السعر لكل شهر', min_value=0)
@@ -102,7 +104,7 @@ class SubscriptionPaymentForm(forms.ModelForm):
 
 class SubscriptionSearchForm(forms.ModelForm):
     user = forms.ModelChoiceField(required=False, queryset=get_all_customers(), widget=UserWidget, label='العميل')
-    division = forms.ModelChoiceField(required=False, queryset=Division.objects.all(), label='الفئة')
+    division = forms.ModelChoiceField(required=False, queryset=Division.objects.select_related('category'), label='الفئة')
     expired = forms.ChoiceField(required=False, choices=[('all', 'الكل'), ('yes', 'منتهٍ'), ('no', 'صالح')],
                                 label='صلاحية الاشتراك', widget=forms.RadioSelect)
 
@@ -116,6 +116,13 @@ class SubscriptionPeriod(models.Model):
     price = models.DecimalField(max_digits=5, decimal_places=2)
     paid_amount = models.DecimalField(max_digits=5, decimal_places=2, default=0)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the month the period was loaded with, so moving it can update the reports of the old month too
+        instance._loaded_start_date = instance.__dict__.get('start_date')
+        return instance
+
     def __str__(self):
         return f'{self.end_date} - {self.start_date} - {self.subscription}'
 
@@ -124,6 +131,13 @@ class TrainingSessionRecord(models.Model):
     division = models.ForeignKey(Division, on_delete=models.SET_NULL, related_name='training_sessions', null=True)
     date = models.DateField()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the day the session was loaded with, so moving it can update the reports of the old month too
+        instance._loaded_date = instance.__dict__.get('date')
+        return instance
+
     # You can reference the individual_records from the TrainingSessionRecord model with the related_name attribute
     # (e.g. training_session_record.individual_records.all()).
 
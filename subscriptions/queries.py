@@ -1,9 +1,16 @@
+from datetime import datetime
+
 from django.db.models import Sum, Count, Q, DecimalField, OuterRef, Subquery
 from django.db.models.query import QuerySet
 from django.contrib.auth import get_user_model
 
+from middleapp.cache import get_or_build, get_range_version
+from middleapp.routers import limit_cache_timeout
 from subscriptions.models import IndividualAttendanceRecord, SubscriptionPeriod, Division
 
+# How long (in seconds) a report is kept, it's rebuilt sooner when the data of its months changes
+REPORT_CACHE_TIMEOUT = 60 * 60
+
 
 def get_all_customers() -> QuerySet:
     """
@@ -26,7 +33,7 @@ def division_report(start_date, end_date):
         start_date__lte=end_date
     ).values('subscription__division').annotate(total_price=Sum('price')).values('total_price')
 
-    return Division.objects.annotate(
+    return Division.objects.select_related('category').annotate(
         subscriptions_count=Count('subscriptions', distinct=True,
                                   filter=Q(subscriptions__subscription_periods__start_date__gte=start_date,
                                            subscriptions__subscription_periods__start_date__lte=end_date)),
@@ -54,3 +61,24 @@ def get_summary_report(start_date, end_date):
         'division_report': division_report(start_date,end_date),
         'training_sessions_report': training_sessions_report(start_date, end_date)
     }
+
+
+def get_cached_summary_report(start_date, end_date):
+    """
+    Get the summary report of a range of days from the cache, it's rebuilt once the subscription periods or the
+    training sessions of any of its months change (see subscriptions/signals.py).
+
+    :param start_date: The first day of the report (a date or a datetime)
+    :param end_date: The last day of the report (a date or a datetime)
+    :return: The same dictionary as get_summary_report, with the division report evaluated to a list
+    """
+    start_date = start_date.date() if isinstance(start_date, datetime) else start_date
+    end_date = end_date.date() if isinstance(end_date, datetime) else end_date
+    key = f'subscriptions_report:{get_range_version("subscription_reports", start_date, end_date)}:' \
+          f'{start_date}:{end_date}'
+
+    def build():
+        return {name: (list(report) if isinstance(report, QuerySet) else report)
+                for name, report in get_summary_report(start_date, end_date).items()}
+
+    return get_or_build(key, build, limit_cache_timeout(REPORT_CACHE_TIMEOUT))
@@ -0,0 +1,46 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from middleapp.cache import bump_cache_version_on_commit, bump_month_versions_on_commit
+from subscriptions.models import SubscriptionPeriod, TrainingSessionRecord, IndividualAttendanceRecord, \
+    Subscription, Division, SportCategory
+
+
+@receiver(post_save, sender=SubscriptionPeriod)
+@receiver(post_delete, sender=SubscriptionPeriod)
+def invalidate_period_reports(sender, instance, **kwargs):
+    # the reports count the periods in the month they start, both the month it was loaded with and the new one
+    bump_month_versions_on_commit('subscription_reports',
+                                  [instance.start_date, getattr(instance, '_loaded_start_date', None)])
+    instance._loaded_start_date = instance.start_date
+
+
+@receiver(post_save, sender=TrainingSessionRecord)
+@receiver(post_delete, sender=TrainingSessionRecord)
+def invalidate_session_reports(sender, instance, **kwargs):
+    bump_month_versions_on_commit('subscription_reports', [instance.date, getattr(instance, '_loaded_date', None)])
+    instance._loaded_date = instance.date
+
+
+@receiver(post_save, sender=IndividualAttendanceRecord)
+@receiver(post_delete, sender=IndividualAttendanceRecord)
+def invalidate_attendance_reports(sender, instance, **kwargs):
+    field = IndividualAttendanceRecord._meta.get_field('training_session_record')
+    if field.is_cached(instance):
+        day = instance.training_session_record.date
+    else:
+        # the session may be deleted already when its records are deleted with it, it bumps its own month then
+        day = (TrainingSessionRecord.objects.filter(pk=instance.training_session_record_id)
+               .values_list('date', flat=True).first())
+    bump_month_versions_on_commit('subscription_reports', [day])
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=Division)
+@receiver(post_delete, sender=Division)
+@receiver(post_save, sender=SportCategory)
+@receiver(post_delete, sender=SportCategory)
+def invalidate_subscription_reports(sender, instance, **kwargs):
+    # the division report of every month lists all the divisions and counts their subscriptions
+    bump_cache_version_on_commit('subscription_reports')
@@ -1,3 +1,95 @@
+from datetime import date, time, timedelta
+
+import pytz
 from django.test import TestCase
+from django.utils import timezone
 
 # Create your tests here.
+from middleapp.testing import QueryBudgetMixin
+from subscriptions.models import SportCategory, Division, TrainingWeekDay, Subscription, SubscriptionPeriod, \
+    TrainingSessionRecord, IndividualAttendanceRecord, Invoice
+from subscriptions.views.category_division_week_days_view import TodaySessionsListView
+from users.models import RSUser
+
+
+class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    The query budgets of the list pages of the subscriptions, see QueryBudgetMixin
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = RSUser.objects.create_superuser(phone='0500000001', password='password', full_name='مدير',
+                                                    gender='M')
+        cls.today = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).date()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.next_phone = 0
+
+    def add_user(self):
+        self.next_phone += 1
+        return RSUser.objects.create_user(phone=f'051{self.next_phone:07}', password='password',
+                                          full_name=f'مشترك {self.next_phone}', gender='M')
+
+    def add_division(self):
+        category = SportCategory.objects.create(name='سباحة')
+        return Division.objects.create(category=category, name='الناشئين', default_month_price=100)
+
+    def add_subscription(self, division=None):
+        subscription = Subscription.objects.create(user=self.add_user(), division=division or self.add_division())
+        SubscriptionPeriod.objects.create(subscription=subscription, start_date=self.today,
+                                          end_date=self.today + timedelta(days=30), price=100)
+        return subscription
+
+    def test_divisions_list(self):
+        def add_divisions(count):
+            for _ in range(count):
+                self.add_division()
+
+        self.assertQueryBudget('/subs/divisions', add_divisions, 8)
+
+    def test_today_sessions(self):
+        today_name = TodaySessionsListView().current_day_arabic
+
+        def add_sessions(count):
+            for _ in range(count):
+                TrainingWeekDay.objects.create(division=self.add_division(), day=today_name, start_time=time(16),
+                                               end_time=time(17))
+
+        self.assertQueryBudget('/subs/', add_sessions, 8)
+
+    def test_subscriptions_search(self):
+        def add_subscriptions(count):
+            for _ in range(count):
+                self.add_subscription()
+
+        self.assertQueryBudget('/subs/search-subscriptions', add_subscriptions, 10)
+
+    def test_previous_records(self):
+        def add_records(count):
+            for _ in range(count):
+                TrainingSessionRecord.objects.create(division=self.add_division(), date=self.today)
+
+        self.assertQueryBudget('/subs/previous-records', add_records, 8)
+
+    def test_individual_history(self):
+        subscription = self.add_subscription()
+
+        def add_records(count):
+            for _ in range(count):
+                record = TrainingSessionRecord.objects.create(division=subscription.division, date=self.today)
+                IndividualAttendanceRecord.objects.create(user=subscription.user, training_session_record=record,
+                                                          attended=True)
+
+        self.assertQueryBudget(f'/subs/attendance-history/{subscription.id}', add_records, 10)
+
+    def test_invoice_list(self):
+        subscription = self.add_subscription()
+
+        def add_invoices(count):
+            for _ in range(count):
+                Invoice.objects.create(subscription=subscription, total_price=100, paid=50, time=timezone.now(),
+                                       action='تسديد دفعة')
+
+        self.assertQueryBudget(f'/subs/invoice-list/{subscription.id}', add_invoices, 10)
@@ -5,7 +5,7 @@ from django.db import models
 from django.db.models import OuterRef, Subquery, Sum, F
 from django.utils import timezone
 
-from subscriptions.models import SubscriptionPeriod, Invoice
+from subscriptions.models import SubscriptionPeriod, Invoice, TrainingWeekDay
 
 
 def add_months(input_date, num_months):
@@ -19,6 +19,17 @@ def add_months(input_date, num_months):
     return new_date
 
 
+def get_weekly_time_range(training_day):
+    """
+    Get the (start, end) minutes of a TrainingWeekDay counted from the beginning of the week (Sunday),
+    to find the conflicting training days of a division with reservations.utilities.find_time_conflicts
+    """
+    days = [day for day, _ in TrainingWeekDay.WEEKDAY_CHOICES]
+    offset = days.index(training_day.day) * 24 * 60
+    return (offset + training_day.start_time.hour * 60 + training_day.start_time.minute,
+            offset + training_day.end_time.hour * 60 + training_day.end_time.minute)
+
+
 def get_confirmed_subscription_queryset_from_params(queryset, params):
     params = validate_subscription_search_params(params)
 
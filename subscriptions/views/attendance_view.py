@@ -1,4 +1,3 @@
-import pdfkit
 import pytz
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
@@ -6,7 +5,6 @@ from django.contrib import messages
 from django.db import models
 from django.db.models import Subquery, OuterRef, Count, Q
 from django.http import Http404
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
@@ -16,6 +14,8 @@ from django.views.generic.edit import FormView
 from django.views import View
 from django.core.exceptions import ObjectDoesNotExist
 
+from middleapp.mixins import RelatedObjectsMixin
+from middleapp.pdf import render_pdf_in_background
 from subscriptions.models import TrainingSessionRecord, IndividualAttendanceRecord, TrainingWeekDay, \
     SubscriptionPeriod, Subscription
 from subscriptions.forms import AttendanceForm, UpdateAttendanceForm
@@ -213,11 +213,12 @@ class UpdateTrainingAttendanceView(LoginRequiredMixin, PermissionRequiredMixin,
         return context
 
 
-class PreviousRecordsList(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class PreviousRecordsList(LoginRequiredMixin, PermissionRequiredMixin, RelatedObjectsMixin, ListView):
     permission_required = 'subscriptions.add_trainingsessionrecord'
     template_name = 'attendance/previous_records.html'
     model = TrainingSessionRecord
     paginate_by = 10
+    select_related = ('division__category',)
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -269,26 +270,24 @@ class AttendanceRecordsView(LoginRequiredMixin, PermissionRequiredMixin, View):
 
         html = render_to_string('attendance/pdf_attendance_record.html', context)
 
-        pdf = pdfkit.from_string(html, False, options=self.options)
+        return render_pdf_in_background(
+            request, html, f'attendance_record_{training_session.division.name}_{training_session.date}.pdf',
+            options=self.options, as_attachment=True)
 
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = \
-            f'attachment; filename="attendance_record_{training_session.division.name}_{training_session.date}.pdf"'
-        return response
 
-
-class IndividualHistoryList(LoginRequiredMixin, ListView):
+class IndividualHistoryList(LoginRequiredMixin, RelatedObjectsMixin, ListView):
     template_name = 'attendance/individual_history.html'
     model = IndividualAttendanceRecord
     paginate_by = 10
     context_object_name = 'individual_records'
+    select_related = ('training_session_record',)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        subscription = get_object_or_404(Subscription, pk=self.kwargs['pk'])
+        subscription = self.subscription
 
-        summary = self.get_queryset().aggregate(overall_attendance=Count('id'),
-                                                attended_count=Count('id', filter=Q(attended=True)))
+        summary = self.object_list.aggregate(overall_attendance=Count('id'),
+                                             attended_count=Count('id', filter=Q(attended=True)))
 
         context.update({'subscription': subscription, 'summary': summary, 'subs_list_active': True})
         return context
@@ -296,7 +295,8 @@ class IndividualHistoryList(LoginRequiredMixin, ListView):
     def get_queryset(self):
         queryset = super().get_queryset()
         thirty_days_ago = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')) - timezone.timedelta(days=30)
-        subscription = get_object_or_404(Subscription, pk=self.kwargs['pk'])
+        self.subscription = subscription = get_object_or_404(
+            Subscription.objects.select_related('user', 'division__category'), pk=self.kwargs['pk'])
         queryset = (queryset.filter(user=subscription.user, training_session_record__division=subscription.division,
                                     training_session_record__date__gte=thirty_days_ago)
                     .order_by('-training_session_record__date'))
@@ -1,3 +1,4 @@
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 from django.db import models
 from django.db.models import Count, Subquery, OuterRef
@@ -7,8 +8,11 @@ from django.utils import timezone
 from django.views.generic import CreateView, UpdateView, ListView, DetailView, FormView
 from django.views.generic.detail import SingleObjectMixin
 
+from middleapp.mixins import RelatedObjectsMixin
 from subscriptions.models import SportCategory, Division, TrainingWeekDay, TrainingSessionRecord
 from subscriptions.forms import CategoryForm, DivisionForm, get_division_trainingDay_inlineformset_factory
+from subscriptions.utilities import get_weekly_time_range
+from reservations.utilities import find_time_conflicts, MINUTES_IN_DAY
 from jsonview.decorators import json_view
 from jsonview.exceptions import BadRequest
 
@@ -79,11 +83,12 @@ def get_division_price(request):
     raise Http404('Division id not provided')
 
 
-class TodaySessionsListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class TodaySessionsListView(LoginRequiredMixin, PermissionRequiredMixin, RelatedObjectsMixin, ListView):
     permission_required = 'subscriptions.add_trainingsessionrecord'
     model = TrainingWeekDay
     template_name = 'categoryDivisionWeekDaysTemplates/today_sessions.html'
     context_object_name = 'sessions'
+    select_related = ('division__category',)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -108,7 +113,7 @@ class TodaySessionsListView(LoginRequiredMixin, PermissionRequiredMixin, ListVie
         existing_records_today = TrainingSessionRecord.objects.filter(date=today)
 
         # Query to exclude WeakDays that already have a TrainingSessionRecord for today
-        queryset = (TrainingWeekDay.objects.filter(division__suspended=False).annotate(
+        queryset = (self.shape_queryset(TrainingWeekDay.objects.filter(division__suspended=False)).annotate(
             existing_records_today=Subquery(
                 existing_records_today.filter(division=OuterRef('division_id')).values('id'),
                 output_field=models.IntegerField()))
@@ -120,16 +125,17 @@ class TodaySessionsListView(LoginRequiredMixin, PermissionRequiredMixin, ListVie
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        sessions_count=self.get_queryset().count()
+        sessions_count = len(self.object_list)
         context.update({'subs_today_sessions_active': True, 'sessions_count':sessions_count})
         return context
 
 
-class DivisionsListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class DivisionsListView(LoginRequiredMixin, UserPassesTestMixin, RelatedObjectsMixin, ListView):
     model = Division
     template_name = 'categoryDivisionWeekDaysTemplates/divisions.html'
     context_object_name = 'divisions'
     queryset = Division.objects.all().annotate(subscription_count=Count('subscriptions'))
+    select_related = ('category',)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -182,6 +188,18 @@ class TrainingDaysEditView(LoginRequiredMixin, PermissionRequiredMixin, SingleOb
                                                                                  instance=self.object)
 
     def form_valid(self, form):
+        changedDays = form.save(commit=False)
+        deletedDays = [obj.pk for obj in form.deleted_objects]
+        unchangedDays = (TrainingWeekDay.objects.filter(division=self.object)
+                         .exclude(pk__in=[obj.pk for obj in changedDays] + deletedDays))
+        allDays = list(changedDays) + list(unchangedDays)
+
+        # only the conflicts that involve a changed training day block the edit
+        for day1, day2 in find_time_conflicts(allDays, get_range=get_weekly_time_range, period=7 * MINUTES_IN_DAY):
+            if day1 in changedDays or day2 in changedDays:
+                messages.error(self.request, f'هناك تعارض بين أوقات التمرين: {day1.day} و {day2.day}')
+                return self.form_invalid(form)
+
         form.save()
         return HttpResponseRedirect(self.get_success_url())
 
@@ -3,19 +3,19 @@ from django.template.loader import render_to_string
 from django.utils import timezone
 from django.views import View
 from django.views.generic import FormView
-from django.http import HttpResponse
 from django.urls import reverse
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib import messages
 
 from urllib.parse import urlencode
 from datetime import datetime
-import pdfkit
 import calendar
 import pytz
 
+from middleapp.pdf import render_pdf_in_background
+from middleapp.routers import use_replica
 from subscriptions.forms import SubscriptionsReportForm
-from subscriptions.queries import get_summary_report
+from subscriptions.queries import get_cached_summary_report
 
 
 class ChooseReportView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
@@ -102,6 +102,7 @@ class SummaryReportView(LoginRequiredMixin, PermissionRequiredMixin, View):
         'margin-left': '0.5in',
     }
 
+    @use_replica()
     def get(self, request):
         if self.request.method == 'GET':
 
@@ -120,7 +121,7 @@ class SummaryReportView(LoginRequiredMixin, PermissionRequiredMixin, View):
                 messages.error(self.request, "يجب اختيار تاريخ التقرير بشكل صحيح")
                 return redirect('subscriptions:choose-report')
 
-            reports = get_summary_report(start_date, end_date)
+            reports = get_cached_summary_report(start_date, end_date)
 
             time = timezone.now().astimezone(pytz.timezone('Asia/Riyadh')).strftime("%Y-%m-%d %H:%M")
 
@@ -132,8 +133,5 @@ class SummaryReportView(LoginRequiredMixin, PermissionRequiredMixin, View):
             }
             html = render_to_string('reports/summary_report.html', context)
 
-            pdf = pdfkit.from_string(html, False, options=self.options)
-
-            response = HttpResponse(pdf, content_type='application/pdf')
-            response['Content-Disposition'] = f'inline; filename="Subscriptions_Summary_Report_{time}.pdf"'
-            return response
+            return render_pdf_in_background(self.request, html, f'Subscriptions_Summary_Report_{time}.pdf',
+                                            options=self.options)
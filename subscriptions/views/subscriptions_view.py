@@ -8,6 +8,7 @@ from django.utils import timezone
 from django.views.generic import CreateView, UpdateView, ListView, DetailView
 from django.views.generic.edit import FormMixin, DeleteView
 
+from middleapp.mixins import RelatedObjectsMixin
 from subscriptions.models import Subscription, SubscriptionPeriod, Invoice
 from subscriptions.forms import SubscriptionCreateForm, ExtendSubscriptionForm, SubscriptionPaymentForm, \
     SubscriptionSearchForm
@@ -247,11 +248,12 @@ class FormListView(FormMixin, ListView):
         return self.render_to_response(context)
 
 
-class SubscriptionListFormView(LoginRequiredMixin, UserPassesTestMixin, FormListView):
+class SubscriptionListFormView(LoginRequiredMixin, UserPassesTestMixin, RelatedObjectsMixin, FormListView):
     form_class = SubscriptionSearchForm
     model = Subscription
     template_name = 'subsTemplates/subscriptions_list_form.html'
     paginate_by = 10
+    select_related = ('user', 'division__category')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+APPLICATIONS_COUNT_KEY = 'customer_applications_count'
+
+# How long (in seconds) the count is kept before it's counted again. The workers don't share the entries
+# of a LocMem cache, so the count of a worker drifts with the changes made by the others until it expires
+APPLICATIONS_COUNT_TIMEOUT = getattr(settings, 'APPLICATIONS_COUNT_TIMEOUT', 300)
+
+
+def count_applications():
+    return get_user_model().objects.filter(confirmed=False).count()
+
+
+def get_applications_count():
+    """
+    Get the number of the customers' applications waiting to be confirmed, from the cache.
+    It's counted from the database only when it's missing or expired, then kept up to date by users/signals.py
+    """
+    count = cache.get(APPLICATIONS_COUNT_KEY)
+    if count is None:
+        count = count_applications()
+        cache.add(APPLICATIONS_COUNT_KEY, count, timeout=APPLICATIONS_COUNT_TIMEOUT)
+    return count
+
+
+def change_applications_count(delta):
+    # incrementing keeps the timeout the count was added with
+    try:
+        cache.incr(APPLICATIONS_COUNT_KEY, delta)
+    except ValueError:
+        # it isn't cached yet, it will be counted on the next read
+        pass
+
+
+def forget_applications_count():
+    cache.delete(APPLICATIONS_COUNT_KEY)
+
+
+def reconcile_applications_count():
+    """
+    Count the applications again and fix the cached count, in case it drifted
+    (ex: the customers were confirmed with queryset.update(), which doesn't send signals)
+
+    :return: A (cached count, actual count) tuple, the cached count is None when it was missing
+    """
+    cached_count = cache.get(APPLICATIONS_COUNT_KEY)
+    count = count_applications()
+    cache.set(APPLICATIONS_COUNT_KEY, count, timeout=APPLICATIONS_COUNT_TIMEOUT)
+    return cached_count, count
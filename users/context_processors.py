@@ -1,6 +1,9 @@
-from django.contrib.auth import get_user_model
+from users.applications import get_applications_count
 
 
 def customer_applications_context_processor(request):
-    customer_applications_count = get_user_model().objects.filter(confirmed=False).count()
-    return {'applications_count': customer_applications_count}
+    # only the staff that can confirm the applications see their count, see subscriptions_base.html
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff or not user.has_perm('subscriptions.add_subscription'):
+        return {'applications_count': 0}
+    return {'applications_count': get_applications_count()}
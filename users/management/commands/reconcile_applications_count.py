@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from middleapp.cache import is_local_cache
+from users.applications import reconcile_applications_count
+
+
+class Command(BaseCommand):
+    help = 'Count the customers\' applications again and fix the cached count shown in the navigation bar'
+
+    def handle(self, *args, **options):
+        if is_local_cache():
+            # the command has its own LocMem cache, the workers' counts are only fixed once they expire
+            self.stderr.write(self.style.WARNING('The cache is not shared with the workers (LocMemCache), '
+                                                 'set CACHE_BACKEND in RS/settings.py to reconcile their count'))
+            return
+
+        cached_count, count = reconcile_applications_count()
+        if cached_count is not None and cached_count != count:
+            self.stdout.write(self.style.WARNING(f'The cached count was {cached_count}, it is fixed to {count}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{count} applications'))
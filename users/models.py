@@ -44,6 +44,15 @@ class RSUser(AbstractBaseUser, PermissionsMixin):
     REQUIRED_FIELDS = ['gender', 'full_name']
     EMAIL_FIELD = 'email'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember if the customer was confirmed when loaded, so confirming it updates the applications count
+        instance._loaded_confirmed = instance.__dict__.get('confirmed')
+        # and the gender, so only changing it updates the rollups of the customer's reservations
+        instance._loaded_gender = instance.__dict__.get('gender')
+        return instance
+
     def get_full_name(self):
         return self.full_name
 
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from users.applications import change_applications_count, forget_applications_count
+from users.models import RSUser
+
+
+def change_applications_count_on_commit(delta):
+    # a change that is rolled back doesn't change the count
+    transaction.on_commit(lambda: change_applications_count(delta))
+
+
+@receiver(post_save, sender=RSUser)
+def update_applications_count(sender, instance, created, **kwargs):
+    if created:
+        if not instance.confirmed:
+            change_applications_count_on_commit(1)
+    elif not hasattr(instance, '_loaded_confirmed'):
+        # the customer wasn't loaded from the database, so it's unknown if it was confirmed before
+        transaction.on_commit(forget_applications_count)
+    elif instance._loaded_confirmed != instance.confirmed:
+        change_applications_count_on_commit(-1 if instance.confirmed else 1)
+    instance._loaded_confirmed = instance.confirmed
+
+
+@receiver(post_delete, sender=RSUser)
+def remove_application(sender, instance, **kwargs):
+    # dismissing an application deletes the customer
+    if not getattr(instance, '_loaded_confirmed', instance.confirmed):
+        change_applications_count_on_commit(-1)